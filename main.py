@@ -1,8 +1,9 @@
-from src.datageneration import make_files
-from src.scoring import analyze, combos
-from src.heatmap import heatmap
 import sys
 import os
+import argparse
+
+# The stages import their modules when they run, so starting the program does not
+# load pandas, matplotlib or seaborn until a stage needs them
 
 # Get the folder where this script lives (project root)
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -13,8 +14,6 @@ PATH_OUTPUT = os.path.join(PROJECT_ROOT, "outputs")
 HEATMAP_FOLDER = os.path.join(PROJECT_ROOT, "figures")
 
 
-import sys
-
 def augment(PATH_DATA: str, PATH_OUTPUT: str):
     """
     Handles user interaction and deck generation / analysis pipeline.
@@ -34,19 +33,16 @@ def augment(PATH_DATA: str, PATH_OUTPUT: str):
             except ValueError:
                 print("Invalid input. Please enter a number.")
 
-        # Call generator
-        print(f"\nGenerating {tot_decks} decks...")
-        filepaths, file_sizes = make_files(tot_n=tot_decks, PATH_DATA=PATH_DATA)
-
-        print(f"\n Done generating {len(filepaths)} file(s)!")
-        for fp, size in zip(filepaths, file_sizes):
-            print(f"Saved: {fp} ({size / 1_000_000:.2f} MB)")
-
-        # Call analyzer
-        print(f"\nAnalyzing decks...")
-        analyze(data_folder=PATH_DATA, df_folder=PATH_OUTPUT, combos=combos, tot_decks = tot_decks)
+        # Call generator and analyzer, each file is scored while the next ones are generated
+        from src.overlap import pipelined_augment
+        from src.scoring import combos
+        print(f"\nGenerating and analyzing {tot_decks} decks...")
+        os.makedirs(PATH_OUTPUT, exist_ok=True)
+        filepaths = pipelined_augment(tot_n=tot_decks, data_folder=PATH_DATA, df_folder=PATH_OUTPUT, combos=combos)
+        print(f"\n Done generating and analyzing {len(filepaths)} file(s)!")
 
         #Call figure maker
+        from src.heatmap import heatmap
         print(f"\nCreating heatmaps...")
         heatmap(df_folder = PATH_OUTPUT, heatmap_folder = HEATMAP_FOLDER)
         print(f"Heatmaps saved to {HEATMAP_FOLDER}")
@@ -54,7 +50,9 @@ def augment(PATH_DATA: str, PATH_OUTPUT: str):
         sys.exit(0)
 
     elif response in {"no", "n"}:
+        from src.heatmap import heatmap
         print(f"\nCreating heatmaps!")
+        heatmap(df_folder = PATH_OUTPUT, heatmap_folder = HEATMAP_FOLDER)
         print(f"Heatmaps saved to {HEATMAP_FOLDER}")
         sys.exit(0) 
 
@@ -63,13 +61,477 @@ def augment(PATH_DATA: str, PATH_OUTPUT: str):
         sys.exit(1)
 
 
-def main():
+# ----------------------------------------------------------
+# Command Line Interface
+# ----------------------------------------------------------
+#
+# python main.py                       interactive prompts (augment)
+# python main.py generate -n 100000    write raw deck files
+# python main.py score                 score the raw deck files
+# python main.py render                draw the heatmaps
+# python main.py run -n 100000         generate, score and render
+# python main.py run -n 1000000 --target-half-width 0.005
+#                                      stream decks until the rates are that precise
+# python main.py bench                 run the benchmark suite (src/benchmark.py)
+# python main.py sweep -n 100000       score a grid of deck compositions (src/sweep.py)
+# python main.py simulate -n 100000    play games without decks (src/simulate.py)
+# python main.py exact                 exact results over every deck (src/exact.py)
+# python main.py estimate -n 100000 --antithetic
+#                                      twin-averaged rates and standard errors
+#
+# generate/run --format store append the decks to one deck store (src/deckstore.py)
+# instead of writing raw files, and score/run then score its unscored decks.
+#
+# Exit codes: 0 on success, 1 when a stage fails (e.g. nothing to score),
+# 2 for invalid arguments.
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+
+# name of the deck store in the data folder
+STORE_FILENAME = "decks.pds"
+
+
+def positive_int(value: str) -> int:
+    """
+    argparse type for options that must be a positive integer.
+    """
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
+def positive_float(value: str) -> float:
+    """
+    argparse type for options that must be a positive number.
+    """
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number, got {value}")
+    return number
+
+
+def check_engine(parser: argparse.ArgumentParser, engine: str, pattern_length: int = 3, deck_sizes=(52,)):
+    """
+    Exit with a usage error if engine is not one of the scoring engines or
+    cannot score patterns of pattern_length cards in decks of deck_sizes cards.
+    """
+    from src.scoring import ENGINES, GENERAL_ENGINES
+    if engine not in ENGINES:
+        parser.error(f"unknown engine '{engine}', choose from {', '.join(ENGINES)}")
+    if pattern_length != 3 and engine not in GENERAL_ENGINES:
+        parser.error(f"engine '{engine}' only scores 3-card patterns, "
+                     f"choose from {', '.join(sorted(GENERAL_ENGINES))}")
+    if any(deck_size != 52 for deck_size in deck_sizes) and engine not in GENERAL_ENGINES:
+        parser.error(f"engine '{engine}' only scores 52-card decks, "
+                     f"choose from {', '.join(sorted(GENERAL_ENGINES))}")
+
+
+def run_generate(args) -> int:
+    """
+    Write args.decks decks to raw deck files in args.data, or append them to
+    its deck store with --format store.
+    """
+    if args.format == "store":
+        from src.deckstore import append_generated
+        store_path = os.path.join(args.data, STORE_FILENAME)
+        print(f"Appending {args.decks} decks to {store_path}...")
+        num_of_decks = append_generated(store_path, args.decks, batch_size=args.max_decks, entropy=args.entropy,
+                                        num_red=args.red, num_black=args.black)
+        print(f"Done, the store holds {num_of_decks} decks")
+        return EXIT_OK
+
+    from src.datageneration import make_files
+    print(f"Generating {args.decks} decks...")
+    filepaths, file_sizes = make_files(
+        tot_n=args.decks, PATH_DATA=args.data, max_decks=args.max_decks, packed=args.packed,
+        workers=args.workers, entropy=args.entropy, file_format=args.format, metrics_path=args.metrics,
+        num_red=args.red, num_black=args.black,
+    )
+    print(f"Done generating {len(filepaths)} file(s), {sum(file_sizes) / 1_000_000:.2f} MB")
+    return EXIT_OK
+
+
+def run_score(args) -> int:
+    """
+    Score every raw deck file in args.data, or the unscored decks of its deck store
+    with --store (or run --format store), and update the results in args.outputs.
+    """
+    from src.scoring import analyze, count_raw_decks, make_combos
+    check_engine(args.parser, args.engine, args.pattern_length)
+    if args.store or getattr(args, "format", None) == "store":
+        return run_score_store(args)
+    if not os.path.isdir(args.data) or count_raw_decks(args.data) == 0:
+        print(f"No raw files found to process in {args.data}", file=sys.stderr)
+        return EXIT_FAILURE
+
+    os.makedirs(args.outputs, exist_ok=True)
+    if args.overlap:
+        from src.overlap import pipelined_analyze
+        pipelined_analyze(args.data, args.outputs, make_combos(args.pattern_length), engine=args.engine,
+                          loaders=args.loaders, scorers=args.scorers, prefetch=args.prefetch,
+                          antithetic=args.antithetic, reverse=args.reverse, metrics_path=args.metrics)
+        return EXIT_OK
+    analyze(data_folder=args.data, df_folder=args.outputs, combos=make_combos(args.pattern_length), tot_decks=count_raw_decks(args.data),
+            engine=args.engine, workers=args.workers, antithetic=args.antithetic, reverse=args.reverse,
+            metrics_path=args.metrics, profile=args.profile)
+    return EXIT_OK
+
+
+def run_score_store(args) -> int:
+    """
+    Score the decks of the deck store in args.data that are not in the results yet.
+    """
+    from src.deckstore import analyze_store
+    from src.scoring import make_combos
+    if args.overlap:
+        args.parser.error("--overlap scores raw files and cannot be used with the deck store")
+    store_path = os.path.join(args.data, STORE_FILENAME)
+    if not os.path.isfile(store_path):
+        print(f"No deck store found at {store_path}", file=sys.stderr)
+        return EXIT_FAILURE
+
+    os.makedirs(args.outputs, exist_ok=True)
+    analyze_store(store_path, args.outputs, make_combos(args.pattern_length), engine=args.engine,
+                  antithetic=args.antithetic, reverse=args.reverse)
+    return EXIT_OK
+
+
+def run_render(args) -> int:
+    """
+    Draw the heatmaps of the results in args.outputs into args.figures.
+    """
+    from src.heatmap import heatmap
+    try:
+        os.makedirs(args.figures, exist_ok=True)
+        heatmap(df_folder=args.outputs, heatmap_folder=args.figures, force=args.force)
+    except FileNotFoundError:
+        print(f"No scoring analysis file found in {args.outputs}", file=sys.stderr)
+        return EXIT_FAILURE
+    print(f"Heatmaps saved to {args.figures}")
+    return EXIT_OK
+
+
+def run_all(args) -> int:
+    """
+    Generate, score and render in one go. With --stream the decks are scored
+    chunk by chunk as they are generated instead of being written to files first,
+    with --overlap every file is scored while the next ones are generated.
+    With --target-half-width or --time-budget decks are streamed until every rate
+    is known that precisely or the time is up, and at most args.decks are added.
+    """
+    check_engine(args.parser, args.engine, args.pattern_length, [args.red + args.black])
+    until_precise = args.target_half_width is not None or args.time_budget is not None
+    if args.stream and args.overlap:
+        args.parser.error("--stream and --overlap cannot be used together")
+    if until_precise and (args.overlap or args.archive is not None):
+        args.parser.error("--target-half-width and --time-budget cannot be used with --overlap or --archive")
+    if args.format == "store" and (args.overlap or args.archive is not None):
+        args.parser.error("--format store cannot be used with --overlap or --archive")
+    if until_precise:
+        from src.pipeline import run_until_precision
+        from src.scoring import make_combos
+        os.makedirs(args.outputs, exist_ok=True)
+        run_until_precision(args.outputs, make_combos(args.pattern_length),
+                            target_half_width=args.target_half_width or 0.005, time_budget=args.time_budget,
+                            max_decks=args.decks, chunk_size=args.chunk_size, engine=args.engine,
+                            entropy=args.entropy, antithetic=args.antithetic, reverse=args.reverse,
+                            num_red=args.red, num_black=args.black)
+    elif args.overlap:
+        from src.overlap import pipelined_augment
+        from src.scoring import make_combos
+        os.makedirs(args.outputs, exist_ok=True)
+        pipelined_augment(args.decks, args.data, args.outputs, make_combos(args.pattern_length), max_decks=args.max_decks,
+                          generators=args.workers, loaders=args.loaders, scorers=args.scorers, prefetch=args.prefetch,
+                          engine=args.engine, packed=args.packed, entropy=args.entropy, file_format=args.format,
+                          antithetic=args.antithetic, reverse=args.reverse, num_red=args.red, num_black=args.black,
+                          metrics_path=args.metrics)
+    elif args.stream:
+        from src.pipeline import stream_analyze
+        from src.scoring import make_combos
+        os.makedirs(args.outputs, exist_ok=True)
+        stream_analyze(args.decks, args.outputs, make_combos(args.pattern_length), chunk_size=args.chunk_size, engine=args.engine,
+                       archive_folder=args.archive, packed=args.packed, entropy=args.entropy,
+                       file_format=args.format, antithetic=args.antithetic, reverse=args.reverse,
+                       num_red=args.red, num_black=args.black)
+    else:
+        status = run_generate(args)
+        if status == EXIT_OK:
+            status = run_score(args)
+        if status != EXIT_OK:
+            return status
+    return run_render(args)
+
+
+def run_bench(args) -> int:
     """
-    Main entry point — just calls augment()
+    Run the benchmark suite, save it as JSON and markdown in args.outputs and
+    compare it to args.baseline if given. Regressions make the exit code 1.
     """
+    from src.benchmark import (
+        run_benchmarks, save_benchmarks, load_benchmarks, compare_benchmarks, benchmarks_to_markdown,
+        BENCHMARK_FILENAME, BENCHMARK_MARKDOWN,
+    )
+    for engine in args.engine or []:
+        check_engine(args.parser, engine)
+
+    benchmarks = run_benchmarks(args.decks, repeats=args.repeats, warmup=args.warmup, engines=args.engine,
+                                seed=args.seed, render=not args.no_render)
+    comparison = None
+    if args.baseline is not None:
+        comparison = compare_benchmarks(benchmarks, load_benchmarks(args.baseline), args.tolerance)
+
+    markdown = benchmarks_to_markdown(benchmarks, comparison)
+    print(markdown)
+    save_benchmarks(benchmarks, os.path.join(args.outputs, BENCHMARK_FILENAME))
+    with open(os.path.join(args.outputs, BENCHMARK_MARKDOWN), "w") as f:
+        f.write(markdown)
+
+    regressions = [row["benchmark"] for row in comparison or [] if row["regression"]]
+    if regressions:
+        print(f"Regressions against {args.baseline}: {', '.join(regressions)}", file=sys.stderr)
+        return EXIT_FAILURE
+    return EXIT_OK
+
+
+def run_sweep(args) -> int:
+    """
+    Score args.decks decks of every deck composition in the grid of args.sizes and
+    args.red_fractions, with one results table per composition in args.folder.
+    """
+    from src.sweep import deck_grid, sweep
+    from src.scoring import make_combos
+    check_engine(args.parser, args.engine, args.pattern_length, args.sizes)
+    configs = deck_grid(args.sizes, args.red_fractions)
+    print(f"Sweeping {len(configs)} deck compositions, {args.decks} decks each...")
+    index = sweep(configs, args.decks, args.folder, make_combos(args.pattern_length), workers=args.workers,
+                  chunk_size=args.chunk_size, engine=args.engine, entropy=args.entropy)
+    print(index.to_string(index=False))
+    return EXIT_OK
+
+
+def run_simulate(args) -> int:
+    """
+    Play args.decks games of every combo with the lockstep simulator and add them
+    to the results in args.outputs, without generating or storing any deck.
+    """
+    from src.simulate import simulate_analyze
+    from src.scoring import make_combos
+    os.makedirs(args.outputs, exist_ok=True)
+    simulate_analyze(args.decks, args.outputs, make_combos(args.pattern_length), batch_size=args.batch_size,
+                     seed=args.seed, num_red=args.red, num_black=args.black)
+    return EXIT_OK
+
+
+def run_exact(args) -> int:
+    """
+    Compute the exact results of every 3-card combo over all 26/26 decks and save
+    them as exact_analysis.csv in args.outputs.
+    """
+    from src.exact import exact_analysis, save_exact_analysis
+    from src.scoring import make_combos
+    save_exact_analysis(exact_analysis(make_combos(3), output=args.output), args.outputs)
+    return EXIT_OK
+
+
+def run_estimate(args) -> int:
+    """
+    Estimate every rate from args.decks decks averaged over their twins, save the
+    rates and standard errors as symmetric_estimates.csv in args.outputs and print
+    how they compare with plain sampling of as many decks.
+    """
+    from src.pipeline import stream_estimates
+    from src.scoring import make_combos, SCORE_COLUMNS
+    check_engine(args.parser, args.engine, args.pattern_length, [args.red + args.black])
+    df = stream_estimates(args.decks, make_combos(args.pattern_length), chunk_size=args.chunk_size,
+                          engine=args.engine, entropy=args.entropy, antithetic=args.antithetic,
+                          reverse=args.reverse, num_red=args.red, num_black=args.black)
+
+    os.makedirs(args.outputs, exist_ok=True)
+    filepath = os.path.join(args.outputs, "symmetric_estimates.csv")
+    df.to_csv(filepath, index=False)
+    print(f"Saved: {filepath}")
+    for col in SCORE_COLUMNS:
+        ratio = (df[f"{col}_se"] / df[f"{col}_plain_se"]).median()
+        print(f"{col}: median standard error {ratio:.2f}x that of plain sampling")
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the argument parser with the generate, score, render, run, bench, sweep,
+    simulate, exact and estimate subcommands.
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Generate, score and plot Penney's game decks. Without a command, asks interactively.",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+
+    # options shared by the subcommands
+    folders = argparse.ArgumentParser(add_help=False)
+    folders.add_argument("--data", default=PATH_DATA, help="folder of the deck files (default: %(default)s)")
+    folders.add_argument("--outputs", default=PATH_OUTPUT, help="folder of the results tables (default: %(default)s)")
+    folders.add_argument("--figures", default=HEATMAP_FOLDER, help="folder of the heatmaps (default: %(default)s)")
+
+    generation = argparse.ArgumentParser(add_help=False)
+    generation.add_argument("-n", "--decks", type=positive_int, required=True, help="number of decks to generate")
+    generation.add_argument("--max-decks", type=positive_int, default=10000, help="decks per file (default: %(default)s)")
+    generation.add_argument("--format", choices=["npy", "pkd", "store"], default="npy",
+                            help=f"storage format: .npy or .pkd raw files, or 'store' to append to the deck store "
+                                 f"<data>/{STORE_FILENAME} (default: %(default)s)")
+    generation.add_argument("--packed", action="store_true", help="save .npy decks as uint64 masks")
+    generation.add_argument("--entropy", type=int, default=None, help="root entropy of the seed streams")
+    generation.add_argument("--red", type=int, default=26, help="red cards per deck (default: %(default)s)")
+    generation.add_argument("--black", type=int, default=26, help="black cards per deck (default: %(default)s)")
+
+    scoring = argparse.ArgumentParser(add_help=False)
+    scoring.add_argument("--engine", default="window", help="scoring engine (default: %(default)s)")
+    scoring.add_argument("-k", "--pattern-length", type=int, default=3, choices=range(3, 9), metavar="K",
+                         help="cards per pattern, 3 to 8; only the window and fsa engines score K > 3 (default: %(default)s)")
+    scoring.add_argument("--antithetic", action="store_true", help="also count every deck's color complement")
+    scoring.add_argument("--reverse", action="store_true", help="also count every deck dealt in reverse")
+    scoring.add_argument("--profile", choices=["cprofile", "tracemalloc"], default=None,
+                         help="profile scoring the first raw file and print the report")
+    scoring.add_argument("--store", action="store_true",
+                         help=f"score the unscored decks of the deck store <data>/{STORE_FILENAME} instead of raw files")
+
+    workers = argparse.ArgumentParser(add_help=False)
+    workers.add_argument("-w", "--workers", type=positive_int, default=1, help="worker processes (default: %(default)s)")
+    workers.add_argument("--metrics", default=None, help="append per-file stage timings to this JSON lines file")
+
+    overlap = argparse.ArgumentParser(add_help=False)
+    overlap.add_argument("--overlap", action="store_true",
+                         help="load (and generate) the next files while scoring, see src/overlap.py")
+    overlap.add_argument("--loaders", type=positive_int, default=1,
+                         help="threads loading files ahead with --overlap and one scorer (default: %(default)s)")
+    overlap.add_argument("--scorers", type=positive_int, default=1,
+                         help="scorers with --overlap, processes that load their own files when more "
+                              "than one (default: %(default)s)")
+    overlap.add_argument("--prefetch", type=positive_int, default=2,
+                         help="files waiting between stages with --overlap (default: %(default)s)")
+
+    render = argparse.ArgumentParser(add_help=False)
+    render.add_argument("--force", action="store_true", help="redraw heatmaps even if the results are unchanged")
+
+    command = subparsers.add_parser("generate", parents=[folders, generation, workers], help="write raw deck files")
+    command.set_defaults(handler=run_generate)
+
+    command = subparsers.add_parser("score", parents=[folders, scoring, workers, overlap], help="score the raw deck files")
+    command.set_defaults(handler=run_score)
+
+    command = subparsers.add_parser("render", parents=[folders, render], help="draw the heatmaps")
+    command.set_defaults(handler=run_render)
+
+    command = subparsers.add_parser("run", parents=[folders, generation, scoring, workers, overlap, render],
+                                    help="generate, score and render")
+    command.add_argument("--stream", action="store_true", help="score decks as they are generated without writing files")
+    command.add_argument("--chunk-size", type=positive_int, default=10000,
+                         help="decks generated and scored at a time with --stream (default: %(default)s)")
+    command.add_argument("--archive", default=None, help="with --stream, also save the decks in this folder")
+    command.add_argument("--target-half-width", type=positive_float, default=None,
+                         help="stream decks until every rate's 95%% interval is this narrow, "
+                              "e.g. 0.005; -n is then the most decks to add")
+    command.add_argument("--time-budget", type=positive_float, default=None,
+                         help="stream decks until every rate's interval is at most +-0.005 "
+                              "(or --target-half-width) or this many seconds have passed")
+    command.set_defaults(handler=run_all)
+
+    command = subparsers.add_parser("bench", parents=[folders], help="run the benchmark suite")
+    command.add_argument("-n", "--decks", type=positive_int, default=20000, help="decks per benchmark (default: %(default)s)")
+    command.add_argument("--repeats", type=positive_int, default=5, help="timed trials per benchmark (default: %(default)s)")
+    command.add_argument("--warmup", type=int, default=1, help="untimed calls before the trials (default: %(default)s)")
+    command.add_argument("--engine", nargs="+", default=None, help="only time these engines (default: all)")
+    command.add_argument("--seed", type=int, default=0, help="seed of the benchmark decks (default: %(default)s)")
+    command.add_argument("--no-render", action="store_true", help="skip the heatmap rendering benchmark")
+    command.add_argument("--baseline", default=None, help="benchmark JSON file to compare against")
+    command.add_argument("--tolerance", type=float, default=0.10,
+                         help="relative slowdown flagged as a regression (default: %(default)s)")
+    command.set_defaults(handler=run_bench)
+
+    command = subparsers.add_parser("sweep", help="score a grid of deck sizes and colour balances")
+    command.add_argument("-n", "--decks", type=positive_int, required=True, help="decks per composition")
+    command.add_argument("--sizes", type=positive_int, nargs="+", default=[20, 32, 52, 78, 104],
+                         help="cards per deck (default: %(default)s)")
+    command.add_argument("--red-fractions", type=float, nargs="+", default=[0.5],
+                         help="fractions of red cards in a deck (default: %(default)s)")
+    command.add_argument("--folder", default=os.path.join(PATH_OUTPUT, "sweep"),
+                         help="folder of the per-composition results and the index (default: %(default)s)")
+    command.add_argument("--engine", default="window", help="scoring engine (default: %(default)s)")
+    command.add_argument("-k", "--pattern-length", type=int, default=3, choices=range(3, 9), metavar="K",
+                         help="cards per pattern, 3 to 8 (default: %(default)s)")
+    command.add_argument("-w", "--workers", type=positive_int, default=1,
+                         help="compositions scored at the same time (default: %(default)s)")
+    command.add_argument("--chunk-size", type=positive_int, default=10000,
+                         help="decks generated and scored at a time (default: %(default)s)")
+    command.add_argument("--entropy", type=int, default=None, help="root entropy of the sweep")
+    command.set_defaults(handler=run_sweep)
+
+    command = subparsers.add_parser("simulate", parents=[folders],
+                                    help="play games in lockstep without decks and add them to the results")
+    command.add_argument("-n", "--decks", type=positive_int, required=True, help="number of games to play")
+    command.add_argument("-k", "--pattern-length", type=int, default=3, choices=range(3, 9), metavar="K",
+                         help="cards per pattern, 3 to 8 (default: %(default)s)")
+    command.add_argument("--batch-size", type=positive_int, default=20000,
+                         help="games played side by side (default: %(default)s)")
+    command.add_argument("--seed", type=int, default=None, help="seed of the card draws")
+    command.add_argument("--red", type=int, default=26, help="red cards per deck (default: %(default)s)")
+    command.add_argument("--black", type=int, default=26, help="black cards per deck (default: %(default)s)")
+    command.set_defaults(handler=run_simulate)
+
+    command = subparsers.add_parser("exact", parents=[folders],
+                                    help="exact results of the 3-card combos over every 26/26 deck")
+    command.add_argument("--output", choices=["float", "fraction", "count"], default="float",
+                         help="probabilities, exact fractions or numbers of decks (default: %(default)s)")
+    command.set_defaults(handler=run_exact)
+
+    command = subparsers.add_parser("estimate", parents=[folders],
+                                    help="twin-averaged rates and standard errors of a batch of decks")
+    command.add_argument("-n", "--decks", type=positive_int, required=True, help="number of decks to generate")
+    command.add_argument("--engine", default="window", help="scoring engine (default: %(default)s)")
+    command.add_argument("-k", "--pattern-length", type=int, default=3, choices=range(3, 9), metavar="K",
+                         help="cards per pattern, 3 to 8 (default: %(default)s)")
+    command.add_argument("--antithetic", action="store_true", help="average every deck with its color complement")
+    command.add_argument("--reverse", action="store_true", help="average every deck with its reversal")
+    command.add_argument("--chunk-size", type=positive_int, default=10000,
+                         help="decks generated and scored at a time (default: %(default)s)")
+    command.add_argument("--entropy", type=int, default=None, help="root entropy of the chunk seed streams")
+    command.add_argument("--red", type=int, default=26, help="red cards per deck (default: %(default)s)")
+    command.add_argument("--black", type=int, default=26, help="black cards per deck (default: %(default)s)")
+    command.set_defaults(handler=run_estimate)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Main entry point. Runs the interactive augment() prompts when no arguments
+    are given, otherwise the requested subcommand, and returns its exit code.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        augment(PATH_DATA, PATH_OUTPUT)
+        return EXIT_OK
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return EXIT_USAGE
 
-    augment(PATH_DATA, PATH_OUTPUT)
+    args.parser = parser
+    try:
+        return args.handler(args)
+    except ValueError as err:
+        # invalid settings found while running, e.g. results of other pattern lengths
+        print(f"error: {err}", file=sys.stderr)
+        return EXIT_FAILURE
+    except KeyboardInterrupt:
+        print("\nInterrupted", file=sys.stderr)
+        return 130
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
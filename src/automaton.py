@@ -0,0 +1,153 @@
+from functools import lru_cache
+
+import numpy as np
+
+# ----------------------------------------------------------
+# State Machine Layout
+# ----------------------------------------------------------
+#
+# The state is the cards dealt since the previous trick, at most the last two:
+#   0      -> no cards yet (start of the deck or right after a trick)
+#   1, 2   -> one card, 1 + card
+#   3 - 6  -> two cards, 3 + (first << 1 | second)
+#
+# Dealing a third card completes a 3-card window. If the window is a player's
+# pattern that player wins the trick and the state goes back to 0, which is the
+# same as score_deck skipping the 3 cards of the trick.
+#
+# For k-card patterns the state holds at most the last k - 1 cards, L cards with
+# value v being state (2**L - 1) + v, so there are 2**k - 1 states and the k = 3
+# layout above is the special case.
+
+NUM_STATES = 7
+NUM_PATTERNS = 8
+
+NO_TRICK = 0
+P1_TRICK = 1
+P2_TRICK = 2
+
+
+def num_states(pattern_length: int = 3) -> int:
+    """
+    Number of states of the state machine for patterns of pattern_length cards.
+    """
+    return (1 << pattern_length) - 1
+
+
+def build_tables(pattern_length: int = 3) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build the transition and emit tables for every (p1, p2) pattern pair.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (transition, emit), both integer arrays of shape
+            (2**k, 2**k, 2**k - 1, 2) indexed by [p1 code, p2 code, state, card],
+            (8, 8, 7, 2) for 3-card patterns.
+            transition holds the next state and emit holds NO_TRICK, P1_TRICK or P2_TRICK.
+    """
+    patterns = 1 << pattern_length
+    states = np.arange(num_states(pattern_length))
+    dtype = np.int8 if len(states) <= np.iinfo(np.int8).max else np.int16
+
+    # number of cards held by every state and their value
+    held = np.floor(np.log2(states + 1)).astype(np.int64)
+    value = states + 1 - (1 << held)
+    full = held == pattern_length - 1
+    tail = (1 << (pattern_length - 1)) - 1
+
+    p1 = np.arange(patterns).reshape(-1, 1, 1)
+    p2 = np.arange(patterns).reshape(1, -1, 1)
+    shape = (patterns, patterns, len(states), 2)
+    transition = np.zeros(shape, dtype=dtype)
+    emit = np.zeros(shape, dtype=np.int8)
+
+    for card in (0, 1):
+        # short piles only grow, full ones complete a window and keep its last k - 1 cards
+        window = (value << 1) | card
+        grown = np.where(full, tail + (window & tail), (1 << (held + 1)) - 1 + window)
+
+        p1_hit = full & (window == p1)
+        p2_hit = full & (window == p2) & ~p1_hit
+        emit[..., card] = np.where(p1_hit, P1_TRICK, np.where(p2_hit, P2_TRICK, NO_TRICK))
+        transition[..., card] = np.where(p1_hit | p2_hit, 0, grown)
+
+    return transition, emit
+
+
+@lru_cache(maxsize=None)
+def pattern_tables(pattern_length: int = 3) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The tables of build_tables, built once per pattern length.
+    """
+    return build_tables(pattern_length)
+
+
+# Tables are built once when the module is imported
+TRANSITION, EMIT = pattern_tables(3)
+
+
+def combo_tables(p1_codes: np.ndarray, p2_codes: np.ndarray,
+                 pattern_length: int = 3) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Select the tables of the given combos and flatten them for np.take lookups.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: flat transition and emit tables of length
+            len(combos) * num_states * 2, the entry for a combo is at
+            (combo * num_states + state) * 2 + card (combo * 14 + state * 2 + card for 3 cards)
+    """
+    transition, emit = pattern_tables(pattern_length)
+    return transition[p1_codes, p2_codes].reshape(-1).astype(np.intp), emit[p1_codes, p2_codes].reshape(-1)
+
+
+def score_decks_fsa(cards: np.ndarray, p1_codes: np.ndarray, p2_codes: np.ndarray,
+                    pattern_length: int = 3) -> dict[str, np.ndarray]:
+    """
+    Score decks by running every combo's state machine over the cards.
+
+    Parameters:
+        cards (np.ndarray): (n, 52) array of 0/1 cards
+        p1_codes (np.ndarray): pattern code of player 1 for every combo
+        p2_codes (np.ndarray): pattern code of player 2 for every combo
+        pattern_length (int): cards per pattern
+
+    Returns:
+        dict[str, np.ndarray]: (n, len(combos)) integer arrays keyed by
+                               'p1_tricks', 'p1_cards', 'p2_tricks', 'p2_cards'
+    """
+    transition, emit = combo_tables(p1_codes, p2_codes, pattern_length)
+    shape = (cards.shape[0], len(p1_codes))
+
+    p1_tricks = np.zeros(shape, dtype=np.int64)
+    p1_cards = np.zeros(shape, dtype=np.int64)
+    p2_tricks = np.zeros(shape, dtype=np.int64)
+    p2_cards = np.zeros(shape, dtype=np.int64)
+
+    # cards in the current pile, counted since the previous trick
+    pile = np.zeros(shape, dtype=np.int64)
+
+    # offset of each combo's block of table entries, 14 for 3-card patterns
+    base = np.arange(len(p1_codes), dtype=np.intp) * (num_states(pattern_length) * 2)
+    index = np.broadcast_to(base, shape).copy()
+
+    for j in range(cards.shape[1]):
+        index += cards[:, j, np.newaxis]
+        result = np.take(emit, index)
+        pile += 1
+
+        p1_hit = result == P1_TRICK
+        p2_hit = result == P2_TRICK
+        p1_tricks += p1_hit
+        p1_cards += np.where(p1_hit, pile, 0)
+        p2_tricks += p2_hit
+        p2_cards += np.where(p2_hit, pile, 0)
+        pile[p1_hit | p2_hit] = 0
+
+        # move to the next state, stored as a table index without the card
+        index = base + np.take(transition, index) * 2
+
+    return {
+        "p1_tricks": p1_tricks,
+        "p1_cards": p1_cards,
+        "p2_tricks": p2_tricks,
+        "p2_cards": p2_cards,
+    }
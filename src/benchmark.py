@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+from tabulate import tabulate
+
+from src.datageneration import generate_decks
+from src.bitpacked import pack_decks
+from src.storage import save_packed, load_packed_masks
+from src.scoring import (
+    ENGINES, combos, score_decks, count_wins_batch, wins_to_array, margin_histograms,
+    array_to_results, save_dataframe_to_csv,
+)
+
+# ----------------------------------------------------------
+# Benchmark Suite
+# ----------------------------------------------------------
+#
+# Every benchmark times one stage of the pipeline on the same fixed-seed decks:
+# a few untimed warmup calls, then repeated timed trials. The result of a
+# benchmark is the median, mean, standard deviation and minimum of its trials
+# and a rate, the amount of work done per second at the median time:
+#
+#   generate          decks/s     generate_decks
+#   write/<format>    MB/s        saving the decks in each storage format
+#   read/<format>     MB/s        loading them back
+#   score/<engine>    games/s     score_decks, one game per deck per combo
+#   aggregate         decks/s     win counts and margin histograms of scored decks
+#   render            figures/s   drawing one heatmap from a results table
+#
+# Results are saved as JSON and as tabulate markdown tables like the ones in
+# figures/all_test_results.md, and can be compared against an earlier JSON run.
+
+BENCHMARK_SEED = 0
+BENCHMARK_FILENAME = "benchmark.json"
+BENCHMARK_MARKDOWN = "benchmark.md"
+
+# storage formats: extension, how to save the decks and how to load them back
+STORAGE_FORMATS = {
+    "npy": (".npy", lambda decks, path: np.save(path, decks), np.load),
+    "npy-packed": (".npy", lambda decks, path: np.save(path, pack_decks(decks)), np.load),
+    "pkd": (".pkd", save_packed, load_packed_masks),
+}
+
+
+def time_trials(fun, repeats: int = 5, warmup: int = 1) -> list[float]:
+    """
+    Call fun warmup times without timing it, then time repeats calls.
+
+    Returns:
+        list[float]: wall-clock seconds of every timed call
+    """
+    for _ in range(warmup):
+        fun()
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fun()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations: list[float], work: float, unit: str) -> dict:
+    """
+    Statistics of the trials of one benchmark, with the rate of work per second at the median time.
+    """
+    median = float(np.median(durations))
+    return {
+        "median_s": median,
+        "mean_s": float(np.mean(durations)),
+        "std_s": float(np.std(durations)),
+        "min_s": float(np.min(durations)),
+        "trials": len(durations),
+        "rate": work / median if median > 0 else float("inf"),
+        "unit": unit,
+    }
+
+
+def bench_generation(num_of_decks: int, repeats: int, warmup: int, seed: int) -> dict:
+    """
+    Deck generation throughput in decks/s.
+    """
+    durations = time_trials(lambda: generate_decks(num_of_decks, seed), repeats, warmup)
+    return {"generate": summarize(durations, num_of_decks, "decks/s")}
+
+
+def bench_storage(decks: np.ndarray, repeats: int, warmup: int, folder: str) -> dict:
+    """
+    Write and read throughput of every storage format in MB/s of file written or read.
+    """
+    results = {}
+    for name, (extension, save, load) in STORAGE_FORMATS.items():
+        path = os.path.join(folder, f"bench_{name}{extension}")
+        durations = time_trials(lambda: save(decks, path), repeats, warmup)
+        size_mb = os.path.getsize(path) / 1_000_000
+        results[f"write/{name}"] = summarize(durations, size_mb, "MB/s")
+
+        durations = time_trials(lambda: load(path), repeats, warmup)
+        results[f"read/{name}"] = summarize(durations, size_mb, "MB/s")
+        results[f"read/{name}"]["file_size_bytes"] = os.path.getsize(path)
+        os.remove(path)
+    return results
+
+
+def bench_scoring(decks: np.ndarray, engines: list[str], repeats: int, warmup: int) -> dict:
+    """
+    Scoring throughput of every engine in games/s (decks times combos).
+    """
+    results = {}
+    for engine in engines:
+        durations = time_trials(lambda: score_decks(decks, combos, engine=engine), repeats, warmup)
+        results[f"score/{engine}"] = summarize(durations, len(decks) * len(combos), "games/s")
+    return results
+
+
+def bench_aggregation(decks: np.ndarray, repeats: int, warmup: int) -> dict:
+    """
+    Throughput of turning the scores of decks into win counts and margin histograms, in decks/s.
+    """
+    scores = score_decks(decks, combos)
+
+    def aggregate():
+        wins_to_array(count_wins_batch(scores))
+        margin_histograms(scores)
+
+    durations = time_trials(aggregate, repeats, warmup)
+    return {"aggregate": summarize(durations, len(decks), "decks/s")}
+
+
+def bench_rendering(decks: np.ndarray, repeats: int, warmup: int, folder: str) -> dict:
+    """
+    Time drawing one heatmap from a results table of the scored decks, in figures/s.
+    """
+    # matplotlib and seaborn are only imported when rendering is benchmarked
+    from src.heatmap import make_heatmap
+
+    totals = wins_to_array(count_wins_batch(score_decks(decks, combos)))
+    df_folder = os.path.join(folder, "outputs")
+    heatmap_folder = os.path.join(folder, "figures")
+    os.makedirs(heatmap_folder, exist_ok=True)
+    save_dataframe_to_csv(array_to_results(totals, combos), df_folder, len(decks))
+
+    durations = time_trials(lambda: make_heatmap(df_folder, heatmap_folder, "Tricks", force=True), repeats, warmup)
+    return {"render": summarize(durations, 1, "figures/s")}
+
+
+def run_benchmarks(num_of_decks: int = 20000, repeats: int = 5, warmup: int = 1,
+                   engines: list[str] | None = None, seed: int = BENCHMARK_SEED,
+                   render: bool = True) -> dict:
+    """
+    Run the whole benchmark suite on num_of_decks decks dealt from a fixed seed.
+
+    Parameters:
+        num_of_decks (int): decks generated, stored and scored by every benchmark
+        repeats (int): timed trials per benchmark
+        warmup (int): untimed calls before the trials
+        engines (list[str] | None): scoring engines to time, all of ENGINES by default
+        seed (int): seed of the decks
+        render (bool): also time heatmap rendering
+
+    Returns:
+        dict: "meta" with the settings and machine, and "results" mapping every
+              benchmark name to its statistics (see summarize)
+    """
+    engines = list(ENGINES) if engines is None else engines
+    for engine in engines:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', choose from {', '.join(ENGINES)}")
+
+    decks = generate_decks(num_of_decks, seed)
+    results = {}
+    results.update(bench_generation(num_of_decks, repeats, warmup, seed))
+    with tempfile.TemporaryDirectory() as folder:
+        results.update(bench_storage(decks, repeats, warmup, folder))
+        results.update(bench_scoring(decks, engines, repeats, warmup))
+        results.update(bench_aggregation(decks, repeats, warmup))
+        if render:
+            results.update(bench_rendering(decks, repeats, warmup, folder))
+
+    meta = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "num_of_decks": num_of_decks,
+        "num_of_combos": len(combos),
+        "repeats": repeats,
+        "warmup": warmup,
+        "seed": seed,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    return {"meta": meta, "results": results}
+
+
+def save_benchmarks(benchmarks: dict, path: str) -> str:
+    """
+    Save the output of run_benchmarks as JSON.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(benchmarks, f, indent=2)
+    return path
+
+
+def load_benchmarks(path: str) -> dict:
+    """
+    Load benchmarks saved by save_benchmarks.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_benchmarks(benchmarks: dict, baseline: dict, tolerance: float = 0.10) -> list[dict]:
+    """
+    Compare the rates of a run against a baseline run.
+
+    Parameters:
+        benchmarks (dict): output of run_benchmarks
+        baseline (dict): an earlier output of run_benchmarks
+        tolerance (float): relative slowdown allowed before a benchmark counts as a regression
+
+    Returns:
+        list[dict]: one row per benchmark in both runs with the baseline rate,
+                    the current rate, the relative change and whether it regressed
+    """
+    rows = []
+    for name, result in benchmarks["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["rate"]
+        after = result["rate"]
+        change = after / before - 1 if before > 0 else 0.0
+        rows.append({
+            "benchmark": name,
+            "unit": result["unit"],
+            "baseline": before,
+            "current": after,
+            "change": change,
+            "regression": change < -tolerance,
+        })
+    return rows
+
+
+def benchmarks_to_markdown(benchmarks: dict, comparison: list[dict] | None = None) -> str:
+    """
+    Format benchmarks (and optionally their comparison to a baseline) as markdown tables.
+    """
+    meta = benchmarks["meta"]
+    lines = [
+        "# Benchmark Results",
+        "",
+        f"{meta['num_of_decks']} decks, {meta['num_of_combos']} combos, seed {meta['seed']}, "
+        f"{meta['repeats']} trials after {meta['warmup']} warmup, "
+        f"Python {meta['python']}, NumPy {meta['numpy']}, {meta['cpu_count']} CPUs, {meta['time']}",
+        "",
+    ]
+
+    rows = [
+        [name, r["rate"], r["unit"], r["median_s"], r["mean_s"], r["std_s"], r["min_s"]]
+        for name, r in benchmarks["results"].items()
+    ]
+    headers = ["Benchmark", "Rate", "Unit", "Median (s)", "Average (s)", "Std (s)", "Min (s)"]
+    lines += [tabulate(rows, headers=headers, tablefmt="grid", floatfmt=".3f"), ""]
+
+    if comparison is not None:
+        rows = [
+            [r["benchmark"], r["baseline"], r["current"], r["unit"], f"{r['change']:+.1%}",
+             "REGRESSION" if r["regression"] else ""]
+            for r in comparison
+        ]
+        headers = ["Benchmark", "Baseline", "Current", "Unit", "Change", ""]
+        lines += ["## Compared to baseline", "",
+                  tabulate(rows, headers=headers, tablefmt="grid", floatfmt=".3f"), ""]
+
+    return "\n".join(lines)
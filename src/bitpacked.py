@@ -0,0 +1,136 @@
+import numpy as np
+
+# ----------------------------------------------------------
+# Packed Deck Layout
+# ----------------------------------------------------------
+#
+# A deck of 52 red/black cards is stored in a single uint64.
+# Bit j holds card j (1 = True/red, 0 = False/black), bits 52-63 are always 0,
+# so a balanced deck is a mask with 26 set bits.
+
+DECK_SIZE = 52
+NUM_WINDOWS = DECK_SIZE - 2
+
+DECK_MASK = np.uint64((1 << DECK_SIZE) - 1)
+WINDOW_MASK = np.uint64((1 << NUM_WINDOWS) - 1)
+
+
+def pack_decks(decks: np.ndarray) -> np.ndarray:
+    """
+    Pack an (n, 52) boolean deck array into n uint64 masks.
+
+    Parameters:
+        decks (np.ndarray): (n, 52) array of decks
+
+    Returns:
+        np.ndarray: (n,) uint64 array, bit j is card j
+    """
+    decks = np.asarray(decks, dtype=bool)
+    packed = np.packbits(decks, axis=1, bitorder="little")
+
+    # pad the 7 packed bytes to 8 so each deck can be viewed as one little-endian uint64
+    padded = np.zeros((decks.shape[0], 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view("<u8").reshape(-1).astype(np.uint64, copy=False)
+
+
+def unpack_decks(packed: np.ndarray) -> np.ndarray:
+    """
+    Unpack uint64 masks back into the (n, 52) boolean deck layout.
+
+    Parameters:
+        packed (np.ndarray): uint64 array of packed decks, any shape
+
+    Returns:
+        np.ndarray: (n, 52) boolean array of decks
+    """
+    as_bytes = np.ascontiguousarray(packed, dtype="<u8").reshape(-1, 1).view(np.uint8)
+    return np.unpackbits(as_bytes, axis=1, count=DECK_SIZE, bitorder="little").astype(bool)
+
+
+def pattern_matches(packed: np.ndarray, code: int) -> np.ndarray:
+    """
+    Find every window of every deck that matches a 3-card pattern.
+
+    Parameters:
+        packed (np.ndarray): uint64 array of packed decks
+        code (int): pattern code 0-7, read as first card << 2 | second << 1 | third
+
+    Returns:
+        np.ndarray: uint64 masks of the same shape, bit i is set when cards
+                    i, i+1, i+2 match the pattern
+    """
+    matches = WINDOW_MASK
+    for offset in range(3):
+        bit = (code >> (2 - offset)) & 1
+        cards = packed if bit else ~packed
+        matches = matches & (cards >> np.uint64(offset))
+    return matches
+
+
+def lowest_bit_index(masks: np.ndarray) -> np.ndarray:
+    """
+    Index of the lowest set bit of every non-zero uint64 mask.
+    """
+    lowest = masks & (~masks + np.uint64(1))
+    return np.bitwise_count(lowest - np.uint64(1)).astype(np.int64)
+
+
+def score_decks_packed(packed: np.ndarray, p1_codes: np.ndarray, p2_codes: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Score packed decks with shifts and masks.
+
+    The matches of all 8 patterns are found once for every deck, then each combo
+    jumps from one trick straight to the next instead of checking every window.
+
+    Parameters:
+        packed (np.ndarray): (n,) uint64 array of packed decks
+        p1_codes (np.ndarray): pattern code of player 1 for every combo
+        p2_codes (np.ndarray): pattern code of player 2 for every combo
+
+    Returns:
+        dict[str, np.ndarray]: (n, len(combos)) integer arrays keyed by
+                               'p1_tricks', 'p1_cards', 'p2_tricks', 'p2_cards'
+    """
+    packed = np.asarray(packed, dtype=np.uint64).reshape(-1)
+    matches = np.stack([pattern_matches(packed, code) for code in range(8)], axis=1)
+
+    p1_matches = matches[:, p1_codes]
+    p2_matches = matches[:, p2_codes]
+    remaining = p1_matches | p2_matches
+    shape = remaining.shape
+
+    p1_tricks = np.zeros(shape, dtype=np.int64)
+    p1_cards = np.zeros(shape, dtype=np.int64)
+    p2_tricks = np.zeros(shape, dtype=np.int64)
+    p2_cards = np.zeros(shape, dtype=np.int64)
+
+    # position where the current pile started
+    start = np.zeros(shape, dtype=np.int64)
+
+    while True:
+        live = remaining != 0
+        if not live.any():
+            break
+
+        i = np.where(live, lowest_bit_index(remaining), 0)
+        p1_hit = live & (((p1_matches >> i.astype(np.uint64)) & np.uint64(1)) == 1)
+        p2_hit = live & ~p1_hit
+
+        cards_to_win = i + 3 - start
+        p1_tricks += p1_hit
+        p1_cards += np.where(p1_hit, cards_to_win, 0)
+        p2_tricks += p2_hit
+        p2_cards += np.where(p2_hit, cards_to_win, 0)
+
+        # skip the 3 cards of the trick by clearing all windows before the new start
+        start = np.where(live, i + 3, start)
+        keep = ~((np.uint64(1) << start.astype(np.uint64)) - np.uint64(1))
+        remaining &= keep
+
+    return {
+        "p1_tricks": p1_tricks,
+        "p1_cards": p1_cards,
+        "p2_tricks": p2_tricks,
+        "p2_cards": p2_cards,
+    }
@@ -0,0 +1,178 @@
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+
+from src.automaton import TRANSITION, EMIT, NUM_STATES, NUM_PATTERNS, P1_TRICK, P2_TRICK
+
+# ----------------------------------------------------------
+# Chunked Transition Tables
+# ----------------------------------------------------------
+#
+# A 52-card deck is 4 chunks of 13 cards. For every pattern pair, entry state of
+# the state machine and 13-card chunk value (8192 of them) the table holds what
+# dealing the chunk does, packed into one int32:
+#
+#   bits  0-2   p1 tricks in the chunk
+#   bits  3-5   p2 tricks in the chunk
+#   bits  6-9   p1 cards won, counting the pile from the start of the chunk
+#   bits 10-13  p2 cards won, counting the pile from the start of the chunk
+#   bits 14-15  winner of the first trick in the chunk (0 = no trick)
+#   bits 16-18  state after the chunk
+#   bits 19-22  cards after the last trick in the chunk
+#
+# The pile carried into the chunk is added to the first trick's winner, and when
+# the chunk has no trick the pile just grows by 13 cards.
+#
+# Card j of a chunk is bit j of its value, the same order as a packed deck.
+
+CHUNK_SIZE = 13
+NUM_CHUNK_VALUES = 1 << CHUNK_SIZE
+CHUNK_MASK = np.uint64(NUM_CHUNK_VALUES - 1)
+
+
+
+def tables_hash() -> str:
+    """
+    Short hash of the state machine tables the chunk tables are built from, so a
+    cache built from another version of the automaton is never loaded.
+    """
+    digest = hashlib.sha256(np.int64(CHUNK_SIZE).tobytes())
+    for table in (TRANSITION, EMIT):
+        digest.update(str(table.dtype).encode())
+        digest.update(np.ascontiguousarray(table).tobytes())
+    return digest.hexdigest()[:16]
+
+
+DEFAULT_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             ".cache", f"chunk_tables_{CHUNK_SIZE}_{tables_hash()}.npy")
+
+
+def build_chunk_tables() -> np.ndarray:
+    """
+    Build the packed chunk tables by running every state machine over every chunk.
+
+    Returns:
+        np.ndarray: (8, 8, NUM_STATES, 8192) int32 table indexed by
+                    [p1 code, p2 code, entry state, chunk value]
+    """
+    shape = (NUM_PATTERNS, NUM_PATTERNS, NUM_STATES, NUM_CHUNK_VALUES)
+    p1 = np.arange(NUM_PATTERNS).reshape(-1, 1, 1, 1)
+    p2 = np.arange(NUM_PATTERNS).reshape(1, -1, 1, 1)
+    values = np.arange(NUM_CHUNK_VALUES).reshape(1, 1, 1, -1)
+
+    state = np.broadcast_to(np.arange(NUM_STATES).reshape(1, 1, -1, 1), shape).copy()
+    p1_tricks = np.zeros(shape, dtype=np.int32)
+    p2_tricks = np.zeros(shape, dtype=np.int32)
+    p1_cards = np.zeros(shape, dtype=np.int32)
+    p2_cards = np.zeros(shape, dtype=np.int32)
+    first = np.zeros(shape, dtype=np.int32)
+    pile = np.zeros(shape, dtype=np.int32)
+
+    for j in range(CHUNK_SIZE):
+        card = (values >> j) & 1
+        result = EMIT[p1, p2, state, card]
+        state = TRANSITION[p1, p2, state, card]
+        pile += 1
+
+        p1_hit = result == P1_TRICK
+        p2_hit = result == P2_TRICK
+        p1_tricks += p1_hit
+        p2_tricks += p2_hit
+        p1_cards += np.where(p1_hit, pile, 0)
+        p2_cards += np.where(p2_hit, pile, 0)
+        first = np.where((first == 0) & (p1_hit | p2_hit), result, first)
+        pile[p1_hit | p2_hit] = 0
+
+    return (p1_tricks | (p2_tricks << 3) | (p1_cards << 6) | (p2_cards << 10)
+            | (first << 14) | (state.astype(np.int32) << 16) | (pile << 19)).astype(np.int32)
+
+
+def load_chunk_tables(cache_path: str | None = DEFAULT_CACHE) -> np.ndarray:
+    """
+    Load the chunk tables from the disk cache, building and saving them the first time.
+    Pass cache_path=None to build them without touching the disk.
+
+    The tables are written to a temporary file in the cache folder and moved into
+    place with os.replace, so a worker process never loads a half-written cache;
+    workers that start before the cache exists each build the tables and the last
+    one to finish replaces the file with identical tables.
+    """
+    if cache_path is not None and os.path.exists(cache_path):
+        return np.load(cache_path)
+
+    tables = build_chunk_tables()
+    if cache_path is not None:
+        folder = os.path.dirname(cache_path)
+        os.makedirs(folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, tables)
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return tables
+
+
+# Tables are loaded once, the first time the chunked engine is used
+CHUNK_TABLES = None
+
+
+def score_decks_chunked(packed: np.ndarray, p1_codes: np.ndarray, p2_codes: np.ndarray,
+                        deck_size: int = 52) -> dict[str, np.ndarray]:
+    """
+    Score packed decks with one table lookup per 13-card chunk per combo.
+
+    Parameters:
+        packed (np.ndarray): (n,) uint64 array of packed decks
+        p1_codes (np.ndarray): pattern code of player 1 for every combo
+        p2_codes (np.ndarray): pattern code of player 2 for every combo
+        deck_size (int): cards per deck, a multiple of 13
+
+    Returns:
+        dict[str, np.ndarray]: (n, len(combos)) integer arrays keyed by
+                               'p1_tricks', 'p1_cards', 'p2_tricks', 'p2_cards'
+    """
+    global CHUNK_TABLES
+    if CHUNK_TABLES is None:
+        CHUNK_TABLES = load_chunk_tables()
+    if deck_size % CHUNK_SIZE != 0:
+        raise ValueError(f"Deck size must be a multiple of {CHUNK_SIZE}, got {deck_size}")
+
+    packed = np.asarray(packed, dtype=np.uint64).reshape(-1)
+    flat = CHUNK_TABLES.reshape(-1)
+    shape = (len(packed), len(p1_codes))
+
+    # offset of each combo's (state, chunk value) block in the flat table
+    base = ((p1_codes * NUM_PATTERNS + p2_codes) * NUM_STATES).astype(np.intp)
+
+    p1_tricks = np.zeros(shape, dtype=np.int64)
+    p1_cards = np.zeros(shape, dtype=np.int64)
+    p2_tricks = np.zeros(shape, dtype=np.int64)
+    p2_cards = np.zeros(shape, dtype=np.int64)
+    state = np.zeros(shape, dtype=np.intp)
+    pile = np.zeros(shape, dtype=np.int64)
+
+    for chunk in range(deck_size // CHUNK_SIZE):
+        value = ((packed >> np.uint64(chunk * CHUNK_SIZE)) & CHUNK_MASK).astype(np.intp)
+        record = np.take(flat, (base + state) * NUM_CHUNK_VALUES + value[:, np.newaxis])
+
+        first = (record >> 14) & 3
+        p1_tricks += record & 7
+        p2_tricks += (record >> 3) & 7
+        p1_cards += ((record >> 6) & 15) + np.where(first == P1_TRICK, pile, 0)
+        p2_cards += ((record >> 10) & 15) + np.where(first == P2_TRICK, pile, 0)
+
+        state = ((record >> 16) & 7).astype(np.intp)
+        pile = np.where(first == 0, pile + CHUNK_SIZE, (record >> 19) & 15)
+
+    return {
+        "p1_tricks": p1_tricks,
+        "p1_cards": p1_cards,
+        "p2_tricks": p2_tricks,
+        "p2_cards": p2_cards,
+    }
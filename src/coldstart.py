@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import statistics
+from datetime import datetime, timezone
+
+# ----------------------------------------------------------
+# Cold-Start Timing
+# ----------------------------------------------------------
+#
+# Every run from a job scheduler starts a fresh interpreter, so the time it takes
+# to import the program before any work is done is paid on every launch. Each
+# statement below is timed in a new interpreter started from the project root.
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# JSON lines file in the outputs folder with one record per measurement
+COLD_START_FILENAME = "cold_start.jsonl"
+
+COLD_START_STATEMENTS = {
+    "interpreter": "pass",
+    "main": "import main",
+    "generate": "import src.datageneration",
+    "score": "import src.scoring",
+    "render": "import src.heatmap",
+}
+
+
+def time_statement(statement: str, repeats: int = 5) -> list[float]:
+    """
+    Wall-clock seconds it takes a new interpreter to run statement, once per repeat.
+    """
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=PROJECT_ROOT, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def measure_cold_start(statements: dict | None = None, repeats: int = 5) -> dict:
+    """
+    Time how long a fresh interpreter takes to import each stage of the program.
+
+    Parameters:
+        statements (dict | None): name -> statement to time, COLD_START_STATEMENTS by default
+        repeats (int): interpreters started per statement
+
+    Returns:
+        dict: name -> {"min": seconds, "median": seconds}
+    """
+    statements = COLD_START_STATEMENTS if statements is None else statements
+    results = {}
+    for name, statement in statements.items():
+        durations = time_statement(statement, repeats)
+        results[name] = {"min": min(durations), "median": statistics.median(durations)}
+    return results
+
+
+def record_cold_start(folder: str, results: dict) -> str:
+    """
+    Append one cold-start measurement to the tracking file in folder.
+
+    Returns:
+        str: path of the tracking file
+    """
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, COLD_START_FILENAME)
+    record = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return path
+
+
+if __name__ == "__main__":
+    results = measure_cold_start()
+    for name, timing in results.items():
+        print(f"{name:<12} min {timing['min']:.3f}s  median {timing['median']:.3f}s")
+    print(f"Recorded in {record_cold_start(os.path.join(PROJECT_ROOT, 'outputs'), results)}")
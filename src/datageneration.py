@@ -1,29 +1,57 @@
-import pandas as pd
 import numpy as np
 import random
 import os
 import re
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.bitpacked import pack_decks
+from src.storage import save_packed, PACKED_EXTENSION
+from src.instrument import (
+    timed, merge_stages, stage_seconds, format_stages, new_progress, report_progress, open_metrics, write_metrics,
+)
 
 
 seed = 0
 
-def generate_decks(n: int, seed: int):
+# JSON lines file in the data folder with the entropy and spawn key of every file
+MANIFEST_FILENAME = "seed_manifest.jsonl"
+
+def generate_decks(n: int, seed: int | np.random.SeedSequence, chunk_size: int = 100_000,
+                   num_red: int = 26, num_black: int = 26):
     """
-    Creates n by 52 array of n amount of shuffled decks each containing 26 Trues and 26 Falses
+    Creates n by (num_red + num_black) array of n amount of shuffled decks each containing
+    num_red Trues (red cards) and num_black Falses (black cards), 26 of each by default
+
+    Every chunk of decks is filled with the base deck and shuffled in place along
+    the card axis with a single rng.permuted call, so no per-deck Python loop and
+    no index array are needed. The same seed always gives the same decks,
+    whatever chunk_size is used.
     """
+    if num_red < 0 or num_black < 0 or num_red + num_black == 0:
+        raise ValueError("A deck needs a non-negative number of red and black cards and at least one card")
     rng = np.random.default_rng(seed)
     
     # base deck
-    deck = np.array([True] * 26 + [False] * 26)
+    deck = np.array([True] * num_red + [False] * num_black)
     
-    # generates n random permutations of indices [0..51]
-    idx = np.array([rng.permutation(52) for _ in range(n)])
-    
-    # applies permutations to deck
-    arr = deck[idx]
+    arr = np.empty((n, deck.size), dtype=bool)
+    for start in range(0, n, chunk_size):
+        chunk = arr[start:start + chunk_size]
+        chunk[:] = deck
+        # shuffles each row of the chunk independently, in place
+        rng.permuted(chunk, axis=1, out=chunk)
     
     return arr
 
+def generate_packed_decks(n: int, seed: int | np.random.SeedSequence):
+    """
+    Creates n shuffled decks packed into uint64 masks with 26 set bits,
+    bit j of a mask is card j of the deck from generate_decks
+    """
+    return pack_decks(generate_decks(n, seed))
+
 def num_of_decks_per_file(tot_n:int, max_decks:int):
     """
     calculate the number of full files there will be and how many leftover decks there will be to go into the file
@@ -34,12 +62,13 @@ def num_of_decks_per_file(tot_n:int, max_decks:int):
     leftover = tot_n % max_decks
     return full_files, leftover
 
-def filepath_raw(seed: int, num_of_decks: int,PATH_DATA: str):
+def filepath_raw(seed: int, num_of_decks: int,PATH_DATA: str, extension: str = ".npy"):
     """
     generate file name for each individual deck
+    extension is '.npy' for np.save files or '.pkd' for packed files
     """
     #create filename based on the random seed and number of decks in the file
-    filename = (f'raw-deck_seed{seed}_num_of_decks{num_of_decks}.npy')
+    filename = (f'raw-deck_seed{seed}_num_of_decks{num_of_decks}{extension}')
     #join the filepath previously listed with the new name
     raw_filepath = os.path.join(PATH_DATA, filename)
         
@@ -64,10 +93,11 @@ def find_next_seed(PATH_DATA:str) -> int:
     in filenames formatted like:
         'raw-deck_seed{seed}_num_of_decks{n}.npy'
         'cooked-deck_seed{seed}_num_of_decks{n}.npy'
+    (or the same names ending in '.pkd' for packed files)
     
     Returns the next unused seed (max + 1), or 0 if no files exist.
     """
-    pattern = re.compile(r"^(?:raw|cooked)-deck_seed(\d+)_num_of_decks\d+\.npy$")
+    pattern = re.compile(r"^(?:raw|cooked)-deck_seed(\d+)_num_of_decks\d+\.(?:npy|pkd)$")
     seeds = []
 
     for fname in os.listdir(PATH_DATA):
@@ -77,61 +107,192 @@ def find_next_seed(PATH_DATA:str) -> int:
 
     return max(seeds) + 1 if seeds else 0
     
-#@measure_rw
-def make_files(tot_n:int, PATH_DATA: str, max_decks:int = 10000):
+def load_root_entropy(PATH_DATA: str) -> int | None:
     """
-    use generate function to make the decks for each file then use save function to 
-    save each file with the filename function
+    Read the root entropy recorded in the seed manifest of PATH_DATA.
+
+    Returns the entropy of the first record, or None if there is no manifest yet.
+    """
+    manifest_path = os.path.join(PATH_DATA, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        for line in f:
+            if line.strip():
+                return int(json.loads(line)["entropy"])
+    return None
+
+def record_seeds(PATH_DATA: str, records: list[dict]):
+    """
+    Append one JSON line per generated file to the seed manifest of PATH_DATA,
+    so any file can be regenerated later from its entropy and spawn key.
+    """
+    os.makedirs(PATH_DATA, exist_ok=True)
+    with open(os.path.join(PATH_DATA, MANIFEST_FILENAME), "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+def write_file(num_of_decks: int, seed_seq: np.random.SeedSequence, filepath: str, packed: bool = False,
+               num_red: int = 26, num_black: int = 26, stages: dict | None = None) -> str:
+    """
+    generate one file's decks from its seed sequence and save them,
+    small enough to send to a worker process
+    files ending in '.pkd' are saved in the packed storage format
+    the time spent generating and saving is added to the 'generate' and 'write'
+    stages of stages when given (see src.instrument)
+    """
+    if filepath.endswith(PACKED_EXTENSION):
+        with timed(stages, "generate"):
+            decks = generate_decks(num_of_decks, seed_seq, num_red=num_red, num_black=num_black)
+        with timed(stages, "write"):
+            save_packed(decks, filepath)
+        return filepath
+    with timed(stages, "generate"):
+        if packed:
+            decks = generate_packed_decks(num_of_decks, seed_seq)
+        else:
+            decks = generate_decks(num_of_decks, seed_seq, num_red=num_red, num_black=num_black)
+    with timed(stages, "write"):
+        savefile([decks], filepath)
+    return filepath
+
+def timed_write_file(num_of_decks: int, seed_seq: np.random.SeedSequence, filepath: str,
+                     packed: bool = False, num_red: int = 26, num_black: int = 26) -> tuple[str, dict]:
+    """
+    write_file that also returns the file's stage timings, so they can be sent back from a worker process
     """
+    stages = {}
+    return write_file(num_of_decks, seed_seq, filepath, packed, num_red, num_black, stages), stages
+
+def regenerate_file(PATH_DATA: str, filename: str):
+    """
+    Regenerate the decks of a file listed in the seed manifest of PATH_DATA.
+
+    Raises:
+        KeyError: If the file is not in the manifest
+    """
+    # raw and cooked names refer to the same decks
+    filename = os.path.basename(filename).replace("cooked-deck", "raw-deck", 1)
+    with open(os.path.join(PATH_DATA, MANIFEST_FILENAME)) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["filename"] == filename:
+                seed_seq = np.random.SeedSequence(record["entropy"], spawn_key=tuple(record["spawn_key"]))
+                if record["packed"]:
+                    return generate_packed_decks(record["num_of_decks"], seed_seq)
+                # files written before deck composition was configurable hold 26 of each
+                return generate_decks(record["num_of_decks"], seed_seq,
+                                      num_red=record.get("num_red", 26), num_black=record.get("num_black", 26))
+    raise KeyError(f"File not found in seed manifest: {filename}")
+
+def plan_files(tot_n: int, PATH_DATA: str, max_decks: int = 10000, packed: bool = False,
+               entropy: int | None = None, file_format: str = "npy", num_red: int = 26, num_black: int = 26):
+    """
+    work out the files make_files writes for tot_n decks, without generating any decks:
+    their sizes, seed sequences, file paths and seed manifest records
+    (see make_files for the arguments)
+    """
+    if file_format not in {"npy", "pkd"}:
+        raise ValueError("Invalid file_format: must be 'npy' or 'pkd'")
+    if packed and file_format == "npy" and (num_red, num_black) != (26, 26):
+        raise ValueError("uint64 masks only hold 26 red and 26 black cards, use file_format 'pkd' for other decks")
+    extension = PACKED_EXTENSION if file_format == "pkd" else ".npy"
+
     #use num of files to determine how many decks go in each file
     full_files, leftover = num_of_decks_per_file(tot_n = tot_n, max_decks = max_decks)
+    sizes = [max_decks] * full_files + ([leftover] if leftover != 0 else [])
 
-    filepaths = [] 
-    
     #find initial seed for generation
+    os.makedirs(PATH_DATA, exist_ok=True)
     seed = find_next_seed(PATH_DATA)
-    
-    for i in range(full_files):
-        #make a placeholder for all decks about to go into the file
-        full_storage = []
-        
-        
-        
-        #generate decks for the full files
-        if full_files != 0:
-            
-            full_storage.append(generate_decks(max_decks, seed))
-            
-            #make filepath/name
-            filepath = filepath_raw(seed, max_decks, PATH_DATA)
 
-            #use save file raw to save the file with all the decks in it  
-            savefile(full_storage, filepath)
+    #reuse the folder's root entropy so file seeds never collide
+    if entropy is None:
+        entropy = load_root_entropy(PATH_DATA)
+    root = np.random.SeedSequence(entropy, n_children_spawned=seed)
+    seed_seqs = root.spawn(len(sizes))
 
-            filepaths.append(filepath)
+    filepaths = [filepath_raw(seed + i, num_of_decks, PATH_DATA, extension) for i, num_of_decks in enumerate(sizes)]
+    records = [
+        {
+            "filename": os.path.basename(filepath),
+            "entropy": root.entropy,
+            "spawn_key": list(seed_seq.spawn_key),
+            "num_of_decks": num_of_decks,
+            "packed": packed and file_format == "npy",
+            "num_red": num_red,
+            "num_black": num_black,
+        }
+        for filepath, seed_seq, num_of_decks in zip(filepaths, seed_seqs, sizes)
+    ]
 
-            #update seed num for next file
-            seed += 1
+    return sizes, seed_seqs, filepaths, records
 
+def make_files(tot_n:int, PATH_DATA: str, max_decks:int = 10000, packed: bool = False, workers: int = 1,
+               entropy: int | None = None, file_format: str = "npy", metrics_path: str | None = None,
+               num_red: int = 26, num_black: int = 26):
+    """
+    use generate function to make the decks for each file then use save function to 
+    save each file with the filename function
+    if packed is True the decks are saved as uint64 masks (8 bytes per deck instead of 52)
+    file_format 'pkd' saves the decks in the packed storage format of src.storage
+    (7 bytes per deck) instead of np.save's '.npy'
+    num_red and num_black set the deck composition; uint64 masks (packed) only hold
+    the standard 26 red / 26 black deck
+
+    every file gets its own stream spawned from one root np.random.SeedSequence,
+    file number k (the seed in its filename) uses spawn key (k,). The root entropy
+    is kept in the seed manifest, so the decks are the same whatever the number of
+    workers and any file can be regenerated with regenerate_file. entropy sets the
+    root explicitly, otherwise the manifest's root (or fresh OS entropy) is used.
+    with workers > 1 the files are generated and written in that many processes
+
+    a progress line with decks/s and the ETA is printed as files are written, and the
+    time spent generating and writing is summed per stage; with metrics_path every
+    file and a final summary are appended to that JSON lines file
+    """
+    sizes, seed_seqs, filepaths, records = plan_files(tot_n, PATH_DATA, max_decks, packed, entropy, file_format,
+                                                      num_red, num_black)
 
+    stages = {}
+    progress = new_progress(tot_n)
+    metrics_file = open_metrics(metrics_path)
+    decks_written = 0
 
-    if leftover != 0:
-        #make new placeholder for decks about to go into leftover file
-        leftover_storage = []
-            
-        #generate decks for the not full files
-        seed = find_next_seed(PATH_DATA)
-        leftover_storage.append(generate_decks(leftover, seed))
+    def written(filepath, num_of_decks, file_stages):
+        nonlocal decks_written
+        decks_written += num_of_decks
+        merge_stages(stages, file_stages)
+        write_metrics(metrics_file, {"event": "file", "filename": os.path.basename(filepath),
+                                     "decks": num_of_decks, "stages": stage_seconds(file_stages)})
+        report_progress(progress, decks_written, label="Generated")
 
-        #make filepath/name
-        filepath = filepath_raw(seed, leftover, PATH_DATA)
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(timed_write_file, sizes, seed_seqs, filepaths, [packed] * len(sizes),
+                                       [num_red] * len(sizes), [num_black] * len(sizes))
+                for num_of_decks, (filepath, file_stages) in zip(sizes, results):
+                    written(filepath, num_of_decks, file_stages)
+        else:
+            for num_of_decks, seed_seq, filepath in zip(sizes, seed_seqs, filepaths):
+                filepath, file_stages = timed_write_file(num_of_decks, seed_seq, filepath, packed, num_red, num_black)
+                written(filepath, num_of_decks, file_stages)
 
-        #use save file raw to save the file with all the decks in it
-        savefile(leftover_storage, filepath)
+        report_progress(progress, decks_written, force=True, label="Generated")
+        print()
 
-        filepaths.append(filepath)
+        record_seeds(PATH_DATA, records)
+        elapsed = time.perf_counter() - progress["start"]
+        write_metrics(metrics_file, {"event": "summary", "decks": decks_written, "files": len(filepaths),
+                                     "seconds": round(elapsed, 6), "decks_per_second": decks_written / elapsed if elapsed else 0.0,
+                                     "workers": workers, "stages": stage_seconds(stages)})
+    finally:
+        if metrics_file is not None:
+            metrics_file.close()
 
+    print(f"Stages: {format_stages(stages)}")
 
     file_sizes = [os.path.getsize(path) for path in filepaths if os.path.exists(path)]
 
-    return filepaths, file_sizes
\ No newline at end of file
+    return filepaths, file_sizes
@@ -0,0 +1,293 @@
+import os
+import struct
+
+import numpy as np
+
+from src.datageneration import generate_decks
+from src.storage import bytes_per_deck, rows_to_decks
+from src.scoring import (
+    check_or_create_wins_df, results_to_array, array_to_results, save_dataframe_to_csv,
+    check_or_create_margins, save_margins, score_batch, margin_bins, deck_composition, SCORE_COLUMNS,
+)
+
+# ----------------------------------------------------------
+# Append-Only Deck Store
+# ----------------------------------------------------------
+#
+# One file holds every deck instead of thousands of small .npy files.
+#
+# header (64 bytes, little-endian):
+#   magic            8 bytes   b"PENNEYDS"
+#   version          uint16
+#   deck_size        uint16    cards per deck (52)
+#   bytes_per_deck   uint16    ceil(deck_size / 8) = 7
+#   num_red          uint16    red cards per deck (26), the rest are black;
+#                              reserved in version 1 stores, which hold 26/26 decks
+#   num_of_decks     uint64    decks committed to the store
+#   num_scored       uint64    decks already added to the results table
+#   entropy          16 bytes  root entropy of the store's seed streams
+#   reserved         16 bytes
+# body:
+#   num_of_decks packed rows, the same rows as a .pkd file
+#
+# Appending writes the new rows after the last committed deck and then updates
+# num_of_decks, so existing data is never rewritten and a half-written batch is
+# simply ignored. Every batch also gets a record in the offset index '<store>.idx':
+# (first deck, number of decks, spawn key) as three uint64.
+#
+# Decks num_scored: num_of_decks take the place of the raw-deck_* files.
+
+STORE_MAGIC = b"PENNEYDS"
+STORE_VERSION = 2
+STORE_HEADER = struct.Struct("<8sHHHHQQ16s16x")
+INDEX_RECORD = np.dtype([("start", "<u8"), ("num_of_decks", "<u8"), ("spawn_key", "<u8")])
+
+
+def index_path(store_path: str) -> str:
+    """
+    Path of the offset index of a deck store.
+    """
+    return store_path + ".idx"
+
+
+def write_store_header(f, header: dict):
+    """
+    Write a deck store header at the start of an open file.
+    """
+    f.seek(0)
+    f.write(STORE_HEADER.pack(
+        STORE_MAGIC, STORE_VERSION, header["deck_size"], header["bytes_per_deck"], header["num_red"],
+        header["num_of_decks"], header["num_scored"], header["entropy"].to_bytes(16, "little"),
+    ))
+
+
+def read_store_header(store_path: str) -> dict:
+    """
+    Read the header of a deck store.
+
+    Raises:
+        ValueError: If the file is not a deck store or has an unknown version
+
+    Returns:
+        dict: deck_size, bytes_per_deck, num_red, num_black, num_of_decks, num_scored and entropy
+    """
+    with open(store_path, "rb") as f:
+        raw = f.read(STORE_HEADER.size)
+    if len(raw) < STORE_HEADER.size:
+        raise ValueError(f"File too short to be a deck store: {store_path}")
+
+    magic, version, deck_size, row_bytes, num_red, num_of_decks, num_scored, entropy = STORE_HEADER.unpack(raw)
+    if magic != STORE_MAGIC:
+        raise ValueError(f"Not a deck store: {store_path}")
+    if version not in (1, STORE_VERSION):
+        raise ValueError(f"Unsupported deck store version {version}: {store_path}")
+    if version == 1:
+        # stores written before the composition was recorded hold 26 of each
+        num_red = deck_size // 2
+
+    return {
+        "deck_size": deck_size,
+        "bytes_per_deck": row_bytes,
+        "num_red": num_red,
+        "num_black": deck_size - num_red,
+        "num_of_decks": num_of_decks,
+        "num_scored": num_scored,
+        "entropy": int.from_bytes(entropy, "little"),
+    }
+
+
+def create_store(store_path: str, num_red: int = 26, num_black: int = 26, entropy: int | None = None) -> dict:
+    """
+    Create an empty deck store, or return the header of the existing one.
+
+    Parameters:
+        store_path (str): file of the store
+        num_red (int): red cards per deck
+        num_black (int): black cards per deck
+        entropy (int | None): root entropy of the store's seed streams, fresh OS entropy by default
+
+    Raises:
+        ValueError: If entropy does not fit in the 16 bytes of the header, or the
+                    existing store holds decks of another composition
+
+    Returns:
+        dict: the store header
+    """
+    if os.path.exists(store_path):
+        header = read_store_header(store_path)
+        if (header["num_red"], header["num_black"]) != (num_red, num_black):
+            raise ValueError(f"{store_path} holds decks of {header['num_red']} red and {header['num_black']} black "
+                             f"cards, not {num_red} red and {num_black} black cards")
+        return header
+    if entropy is not None and not 0 <= entropy < 1 << 128:
+        raise ValueError(f"The root entropy of a deck store must be between 0 and 2**128 - 1, got {entropy}")
+
+    directory = os.path.dirname(store_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    deck_size = num_red + num_black
+    header = {
+        "deck_size": deck_size,
+        "bytes_per_deck": bytes_per_deck(deck_size),
+        "num_red": num_red,
+        "num_black": num_black,
+        "num_of_decks": 0,
+        "num_scored": 0,
+        "entropy": np.random.SeedSequence(entropy).entropy,
+    }
+    with open(store_path, "wb") as f:
+        write_store_header(f, header)
+    open(index_path(store_path), "wb").close()
+    return header
+
+
+def append_decks(store_path: str, decks: np.ndarray, spawn_key: int = 0) -> int:
+    """
+    Append a batch of (n, deck_size) boolean decks to the end of a deck store.
+
+    Returns:
+        int: index of the first appended deck
+    """
+    header = read_store_header(store_path)
+    decks = np.asarray(decks, dtype=bool)
+    if decks.shape[1] != header["deck_size"]:
+        raise ValueError(f"Expected decks of {header['deck_size']} cards, got {decks.shape[1]}")
+    if len(decks) and deck_composition(decks) != (header["num_red"], header["num_black"]):
+        raise ValueError(f"Expected decks of {header['num_red']} red and {header['num_black']} black cards, "
+                         f"got {deck_composition(decks)}")
+
+    start = header["num_of_decks"]
+    rows = np.packbits(decks, axis=1, bitorder="little")
+
+    with open(store_path, "r+b") as f:
+        # write after the last committed deck, then commit by updating the header
+        f.seek(STORE_HEADER.size + start * header["bytes_per_deck"])
+        f.write(rows.tobytes())
+        f.truncate()
+        f.flush()
+        header["num_of_decks"] = start + len(decks)
+        write_store_header(f, header)
+
+    record = np.array([(start, len(decks), spawn_key)], dtype=INDEX_RECORD)
+    with open(index_path(store_path), "ab") as f:
+        f.write(record.tobytes())
+
+    return start
+
+
+def read_index(store_path: str) -> np.ndarray:
+    """
+    Read the offset index of a deck store as a structured array of
+    (start, num_of_decks, spawn_key) records.
+    """
+    return np.fromfile(index_path(store_path), dtype=INDEX_RECORD)
+
+
+def append_generated(store_path: str, tot_n: int, batch_size: int = 10000, entropy: int | None = None,
+                     num_red: int = 26, num_black: int = 26) -> int:
+    """
+    Generate tot_n decks of num_red red and num_black black cards and append them
+    to a deck store batch_size decks at a time.
+
+    Batch k of the store uses spawn key (k,) of the store's root entropy, so every
+    batch can be regenerated from the index. entropy is only used when the store
+    is created; an existing store keeps its own root entropy.
+
+    Returns:
+        int: number of decks in the store afterwards
+    """
+    header = create_store(store_path, num_red, num_black, entropy)
+    batch = len(read_index(store_path))
+    root = np.random.SeedSequence(header["entropy"], n_children_spawned=batch)
+
+    for start in range(0, tot_n, batch_size):
+        num_of_decks = min(batch_size, tot_n - start)
+        seed_seq = root.spawn(1)[0]
+        append_decks(store_path, generate_decks(num_of_decks, seed_seq, num_red=num_red, num_black=num_black),
+                     spawn_key=seed_seq.spawn_key[0])
+
+    return read_store_header(store_path)["num_of_decks"]
+
+
+def open_decks(store_path: str) -> np.memmap:
+    """
+    Memory-map the committed decks of a store as (num_of_decks, bytes_per_deck) packed rows.
+    Nothing is read until a range of rows is used.
+    """
+    header = read_store_header(store_path)
+    if header["num_of_decks"] == 0:
+        return np.zeros((0, header["bytes_per_deck"]), dtype=np.uint8)
+    return np.memmap(
+        store_path, dtype=np.uint8, mode="r", offset=STORE_HEADER.size,
+        shape=(header["num_of_decks"], header["bytes_per_deck"]),
+    )
+
+
+def score_store_range(store_path: str, combos: list, start: int = 0, stop: int | None = None,
+                      engine: str = "bitwise", chunk_size: int = 10000, antithetic: bool = False,
+                      reverse: bool = False) -> tuple[np.ndarray, int, np.ndarray]:
+    """
+    Score decks start:stop of a deck store a chunk at a time, optionally with
+    their twins (see score_batch).
+
+    Returns:
+        tuple[np.ndarray, int, np.ndarray]: (len(combos), 6) win/loss/draw counts in
+            SCORE_COLUMNS order, the number of games and the margin_histograms of those games
+    """
+    rows = open_decks(store_path)
+    deck_size = read_store_header(store_path)["deck_size"]
+    stop = len(rows) if stop is None else min(stop, len(rows))
+
+    counts = np.zeros((len(combos), len(SCORE_COLUMNS)), dtype=np.int64)
+    margins = np.zeros((len(combos), sum(margin_bins(deck_size))), dtype=np.int64)
+    num_of_games = 0
+    for chunk_start in range(start, stop, chunk_size):
+        decks = rows_to_decks(rows[chunk_start:min(chunk_start + chunk_size, stop)], deck_size)
+        chunk_counts, chunk_games, chunk_margins = score_batch(decks, combos, engine, antithetic, reverse)
+        counts += chunk_counts
+        margins += chunk_margins
+        num_of_games += chunk_games
+    return counts, num_of_games, margins
+
+
+def analyze_store(store_path: str, df_folder: str, combos: list, engine: str = "bitwise", chunk_size: int = 10000,
+                  antithetic: bool = False, reverse: bool = False):
+    """
+    Score the decks of a store that are not in the results table yet and save/update
+    the cumulative DataFrame, then mark them as scored in the store header.
+    With antithetic and/or reverse every deck also counts as its twins, like analyze.
+    """
+    header = read_store_header(store_path)
+    start, stop = header["num_scored"], header["num_of_decks"]
+    if start >= stop:
+        print("No unscored decks in the store.")
+        return
+
+    num_red, num_black = header["num_red"], header["num_black"]
+    df, num_of_decks_scored = check_or_create_wins_df(df_folder, combos, num_red, num_black)
+    totals = results_to_array(df, combos)
+    margins, num_of_games_in_margins = check_or_create_margins(df_folder, combos, num_of_decks_scored,
+                                                               header["deck_size"])
+
+    for chunk_start in range(start, stop, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, stop)
+        counts, num_of_games, chunk_margins = score_store_range(store_path, combos, chunk_start, chunk_stop, engine,
+                                                                chunk_size, antithetic, reverse)
+        totals += counts
+        margins += chunk_margins
+        num_of_decks_scored += num_of_games
+        num_of_games_in_margins += num_of_games
+        progress_percent = (chunk_stop - start) / (stop - start) * 100
+        print(f"Processed {chunk_stop - start}/{stop - start} decks ({progress_percent:.2f}%)", end='\r', flush=True)
+
+    save_dataframe_to_csv(array_to_results(totals, combos), df_folder, num_of_decks_scored, num_red, num_black)
+    save_margins(margins, df_folder, combos, num_of_games_in_margins)
+
+    # only mark the decks as scored once the results are saved
+    with open(store_path, "r+b") as f:
+        header = read_store_header(store_path)
+        header["num_scored"] = stop
+        write_store_header(f, header)
+
+    print(f"Total decks scored: {num_of_decks_scored}")
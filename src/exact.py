@@ -0,0 +1,224 @@
+from fractions import Fraction
+from functools import lru_cache
+from math import comb
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.automaton import TRANSITION, EMIT, NUM_STATES, P1_TRICK, P2_TRICK
+
+# ----------------------------------------------------------
+# Exact Dynamic Programming Engine
+# ----------------------------------------------------------
+#
+# Instead of sampling decks, count how many of the comb(52, 26) equally likely
+# decks end with every trick and card margin. Cards are dealt one at a time and
+# the decks are grouped by (reds dealt, state machine state, margin), plus the
+# size of the current pile for card scoring. Tricks and cards only need their own
+# margin, so they are counted in two separate, much smaller tables.
+#
+# Counts never exceed comb(52, 26) < 2**53, so int64 counts are exact.
+
+NUM_RED = 26
+NUM_BLACK = 26
+DECK_SIZE = NUM_RED + NUM_BLACK
+
+# most tricks / cards one player can be ahead by
+MAX_TRICKS = DECK_SIZE // 3
+MAX_CARDS = DECK_SIZE
+
+TOTAL_DECKS = comb(DECK_SIZE, NUM_RED)
+
+
+def deal(counts: np.ndarray, dealt: int, step) -> np.ndarray:
+    """
+    Deal the next card to every group of decks.
+
+    Parameters:
+        counts (np.ndarray): (NUM_RED + 1, NUM_STATES, ...) deck counts indexed by reds dealt
+        dealt (int): number of cards already dealt
+        step (callable): step(counts_in_state, state, card, out) adds the decks moved
+                         by dealing card in state to out, indexed by the new state
+
+    Returns:
+        np.ndarray: counts after one more card
+    """
+    new_counts = np.zeros_like(counts)
+
+    # a black card can only be dealt while blacks are left, i.e. reds dealt > dealt - NUM_BLACK
+    black_ok = counts.copy()
+    if dealt - NUM_BLACK >= 0:
+        black_ok[dealt - NUM_BLACK] = 0
+
+    for state in range(NUM_STATES):
+        # red card: reds dealt goes up by one
+        step(counts[:-1, state], state, 1, new_counts[1:])
+        # black card: reds dealt stays the same
+        step(black_ok[:, state], state, 0, new_counts)
+
+    return new_counts
+
+
+def trick_margin_counts(p1: int, p2: int) -> np.ndarray:
+    """
+    Count decks by trick margin (p1 tricks - p2 tricks) for one pattern pair.
+
+    Returns:
+        np.ndarray: int64 counts of length 2 * MAX_TRICKS + 1, index 0 is a margin of -MAX_TRICKS
+    """
+    transition = TRANSITION[p1, p2]
+    emit = EMIT[p1, p2]
+
+    counts = np.zeros((NUM_RED + 1, NUM_STATES, 2 * MAX_TRICKS + 1), dtype=np.int64)
+    counts[0, 0, MAX_TRICKS] = 1
+
+    def step(group, state, card, out):
+        target = out[:, transition[state, card]]
+        if emit[state, card] == P1_TRICK:
+            target[:, 1:] += group[:, :-1]
+        elif emit[state, card] == P2_TRICK:
+            target[:, :-1] += group[:, 1:]
+        else:
+            target += group
+
+    for dealt in range(DECK_SIZE):
+        counts = deal(counts, dealt, step)
+
+    return counts[NUM_RED].sum(axis=0)
+
+
+# Index arrays to move every pile size's margins by pile + 1 in one assignment
+PILE = np.arange(DECK_SIZE + 1)[:, np.newaxis]
+MARGIN = np.arange(2 * MAX_CARDS + 1)[np.newaxis, :]
+WIDE = 2 * MAX_CARDS + 1 + 2 * (DECK_SIZE + 1)
+
+
+def card_margin_counts(p1: int, p2: int) -> np.ndarray:
+    """
+    Count decks by card margin (p1 cards - p2 cards) for one pattern pair.
+
+    Returns:
+        np.ndarray: int64 counts of length 2 * MAX_CARDS + 1, index 0 is a margin of -MAX_CARDS
+    """
+    transition = TRANSITION[p1, p2]
+    emit = EMIT[p1, p2]
+
+    # indexed by [reds dealt, state, cards in pile, margin]
+    counts = np.zeros((NUM_RED + 1, NUM_STATES, DECK_SIZE + 1, 2 * MAX_CARDS + 1), dtype=np.int64)
+    counts[0, 0, 0, MAX_CARDS] = 1
+
+    # the trick winner gets the pile plus the card just dealt
+    shift = PILE + 1
+    offset = DECK_SIZE + 1
+
+    def step(group, state, card, out):
+        new_state = transition[state, card]
+        winner = emit[state, card]
+        if winner == P1_TRICK or winner == P2_TRICK:
+            sign = 1 if winner == P1_TRICK else -1
+            wide = np.zeros((group.shape[0], DECK_SIZE + 1, WIDE), dtype=np.int64)
+            wide[:, PILE, MARGIN + offset + sign * shift] = group
+            out[:, 0, 0] += wide.sum(axis=1)[:, offset:offset + 2 * MAX_CARDS + 1]
+        else:
+            out[:, new_state, 1:] += group[:, :-1]
+
+    for dealt in range(DECK_SIZE):
+        counts = deal(counts, dealt, step)
+
+    return counts[NUM_RED].sum(axis=(0, 1))
+
+
+@lru_cache(maxsize=None)
+def margin_counts(p1: int, p2: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Trick and card margin counts for a pattern pair, shared between combos.
+
+    Swapping the colors of every card gives an equally likely deck, so (p1, p2)
+    has the same counts as (~p1, ~p2). Swapping the players reverses the margins.
+    Both are used so the 56 combos only need 16 dynamic programs.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (trick margin counts, card margin counts)
+    """
+    complement = (7 - p1, 7 - p2)
+    if complement < (p1, p2):
+        return margin_counts(*complement)
+    if (p2, p1) < (p1, p2):
+        tricks, cards = margin_counts(p2, p1)
+        return tricks[::-1].copy(), cards[::-1].copy()
+
+    return trick_margin_counts(p1, p2), card_margin_counts(p1, p2)
+
+
+def outcome_counts(margins: np.ndarray) -> tuple[int, int, int]:
+    """
+    Split margin counts into (p1 wins, p2 wins, draws).
+    """
+    middle = len(margins) // 2
+    return int(margins[middle + 1:].sum()), int(margins[:middle].sum()), int(margins[middle])
+
+
+def exact_analysis(combos: list, output: str = "float") -> pd.DataFrame:
+    """
+    Exact win/loss/draw results for every combo over all comb(52, 26) decks.
+
+    Parameters:
+        combos (list): a list of all the combinations of players' choices
+        output (str): 'float' for probabilities, 'fraction' for exact Fractions,
+                      or 'count' for the number of decks, which is the same table
+                      analyze would write after scoring every possible deck once
+
+    Raises:
+        ValueError: If output is not 'float', 'fraction' or 'count', or the
+                    patterns in combos are not 3 cards long
+
+    Returns:
+        pd.DataFrame: same columns as scoring_analysis_N=*.csv
+    """
+    if output not in {"float", "fraction", "count"}:
+        raise ValueError("Invalid output: must be 'float', 'fraction' or 'count'")
+    if any(len(str(combo[player])) != 3 for combo in combos for player in ("player_a", "player_b")):
+        raise ValueError("Exact analysis only covers 3-card patterns")
+
+    rows = []
+    for combo in combos:
+        p1 = str(combo["player_a"])
+        p2 = str(combo["player_b"])
+        trick_margins, card_margins = margin_counts(int(p1, 2), int(p2, 2))
+
+        p1_wins_tricks, p2_wins_tricks, draws_tricks = outcome_counts(trick_margins)
+        p1_wins_cards, p2_wins_cards, draws_cards = outcome_counts(card_margins)
+        rows.append({
+            "p1": p1,
+            "p2": p2,
+            "p1_wins_cards": p1_wins_cards,
+            "p1_wins_tricks": p1_wins_tricks,
+            "p2_wins_cards": p2_wins_cards,
+            "p2_wins_tricks": p2_wins_tricks,
+            "draws_cards": draws_cards,
+            "draws_tricks": draws_tricks,
+        })
+
+    df = pd.DataFrame(rows)
+    score_columns = df.columns[2:]
+    if output == "float":
+        df[score_columns] = df[score_columns] / TOTAL_DECKS
+    elif output == "fraction":
+        df[score_columns] = df[score_columns].map(lambda n: Fraction(n, TOTAL_DECKS)).astype(object)
+
+    return df
+
+
+def save_exact_analysis(df: pd.DataFrame, folder: str) -> str:
+    """
+    Save an exact_analysis table as 'exact_analysis.csv' in folder.
+
+    Returns:
+        str: path of the saved file
+    """
+    os.makedirs(folder, exist_ok=True)
+    filepath = os.path.join(folder, "exact_analysis.csv")
+    df.to_csv(filepath, index=False)
+    print(f"Saved: {filepath}")
+    return filepath
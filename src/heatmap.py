@@ -1,11 +1,20 @@
+import os
 import pandas as pd
 import numpy as np
+import matplotlib
+
+# Figures are only ever saved to files, so use the non-interactive Agg backend
+# unless one is chosen explicitly through MPLBACKEND
+if "MPLBACKEND" not in os.environ:
+    matplotlib.use("Agg")
+
 import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import matplotlib.colors as mcolors
-import os
 import re
+import json
+import hashlib
 
 # ----------------------------------------------------------
 # Utility Functions
@@ -13,19 +22,19 @@ import re
 
 def find_scoring_analysis_filename(folder_path):
     """
-    Searches the given folder for the first .csv file and returns its full path.
+    Searches the given folder for the scoring analysis .csv file and returns its full path.
 
     Parameters:
         folder_path (str): Path to the folder containing the scoring analysis files.
 
     Returns:
-        str: Full file path to the first .csv file found.
+        str: Full file path to the first 'scoring_analysis_N=*.csv' file found.
 
     Raises:
-        FileNotFoundError: If no .csv file is found in the folder.
+        FileNotFoundError: If no scoring analysis file is found in the folder.
     """
     for filename in os.listdir(folder_path):
-        if filename.endswith('.csv'):
+        if re.match(r"scoring_analysis_N=\d+\.csv$", filename):
             full_path = os.path.join(folder_path, filename)
             return full_path
         else:
@@ -106,22 +115,20 @@ def matrix(df):
     Returns:
         tuple: (value_matrix, annotation_matrix)
     """
-    # Format text as "Win% (Draw%)"
-    df["annotation"] = df.apply(lambda row: f'{int(row["p1_win_rate"]*100)} ({int(row["draw_rate"]*100)})', axis=1)
-
-    # Extract all unique player combinations for matrix axes
-    p1_values = sorted(df["p1"].unique())
-    p2_values = sorted(df["p2"].unique())
+    # Format text as "Win% (Draw%)", truncating the percentages like int() does
+    win_percent = (df["p1_win_rate"] * 100).astype(int).astype(str)
+    draw_percent = (df["draw_rate"] * 100).astype(int).astype(str)
+    df["annotation"] = win_percent + " (" + draw_percent + ")"
 
-    # Initialize annotation matrix with NaN
-    annotation_matrix = pd.DataFrame(index=p1_values, columns=p2_values)
+    # Pivot both columns at once, rows and columns come out sorted and the
+    # diagonal (same choice for both players) stays NaN
+    matrices = df.pivot(index="p1", columns="p2", values=["p1_win_rate", "annotation"])
 
-    # Fill in annotation values (e.g., "65 (10)")
-    for _, row in df.iterrows():
-        annotation_matrix.loc[row["p1"], row["p2"]] = row["annotation"]
-
-    # Pivot numerical data to create a value matrix for coloring
-    value_matrix = df.pivot(index="p1", columns="p2", values="p1_win_rate")
+    # Numerical matrix for coloring and text matrix (e.g., "65 (10)") for annotations
+    value_matrix = matrices["p1_win_rate"].astype(float)
+    annotation_matrix = matrices["annotation"]
+    annotation_matrix.index.name = None
+    annotation_matrix.columns.name = None
 
     return value_matrix, annotation_matrix
 
@@ -149,32 +156,101 @@ def blackbox(value_matrix, ax):
             )
 
 
+# ----------------------------------------------------------
+# Render Cache
+# ----------------------------------------------------------
+
+# Bump when the plot code changes so cached figures are re-rendered
+RENDER_VERSION = 1
+RENDER_CACHE_FILENAME = ".render_cache.json"
+
+
+def render_key(filename: str, t_or_c: str, figsize: tuple | None) -> str:
+    """
+    Content hash of the scoring analysis file and the plot parameters.
+
+    Parameters:
+        filename (str): Full path to the scoring analysis CSV file.
+        t_or_c (str): Type of analysis ('Tricks' or 'Cards').
+        figsize (tuple | None): Figure size in inches, None when it follows the matrix size.
+
+    Returns:
+        str: SHA-256 hex digest identifying this rendering.
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    params = {"name": os.path.basename(filename), "t_or_c": t_or_c,
+              "figsize": None if figsize is None else list(figsize), "version": RENDER_VERSION}
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def load_render_cache(heatmap_folder: str) -> dict:
+    """
+    Loads the render cache of a heatmap folder, mapping figure file names to render keys.
+    """
+    path = os.path.join(heatmap_folder, RENDER_CACHE_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_render_cache(heatmap_folder: str, cache: dict):
+    """
+    Saves the render cache of a heatmap folder.
+    """
+    with open(os.path.join(heatmap_folder, RENDER_CACHE_FILENAME), "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
 # ----------------------------------------------------------
 # Main Heatmap Creation
 # ----------------------------------------------------------
 
-def make_heatmap(df_folder: str, heatmap_folder: str, t_or_c: str = 'Tricks'):
+def make_heatmap(df_folder: str, heatmap_folder: str, t_or_c: str = 'Tricks',
+                 figsize: tuple | None = None, force: bool = False) -> bool:
     """
     Generates and saves a heatmap for either 'Tricks' or 'Cards' results.
 
+    The figure is skipped when it already exists and was rendered from the same
+    scoring analysis file contents and plot parameters (see render_key).
+
     Parameters:
         df_folder (str): Folder containing scoring analysis CSV file.
         heatmap_folder (str): Folder to save the generated heatmap.
         t_or_c (str): Type of analysis ('Tricks' or 'Cards').
+        figsize (tuple | None): Figure size in inches, by default 10 x 8 for the 8 x 8
+                                matrix of 3-card patterns and scaled up with the
+                                matrix for longer patterns so every cell stays readable.
+        force (bool): Render even if the cached figure is up to date.
+
+    Returns:
+        bool: True if the heatmap was rendered, False if the cached one was kept.
     """
-    # Find and load the scoring data
+    if t_or_c not in ('Tricks', 'Cards'):
+        raise ValueError("Invalid input: must be 'Tricks' or 'Cards'")
+
+    # Find the scoring data and check whether the figure is already up to date
     filename = find_scoring_analysis_filename(df_folder)
+    figure_name = f"By{t_or_c}.svg"
+    key = render_key(filename, t_or_c, figsize)
+    cache = load_render_cache(heatmap_folder)
+    if not force and cache.get(figure_name) == key and os.path.exists(os.path.join(heatmap_folder, figure_name)):
+        return False
+
+    # Load the scoring data
     N = find_num_of_decks_scored(filename)
     df = load_scoring_analysis(filename)
 
     # Compute statistics based on analysis type
     if t_or_c == 'Tricks':
         df = calculate('p1_wins_tricks', 'p2_wins_tricks', 'draws_tricks', df)
-    elif t_or_c == 'Cards':
-        df = calculate('p1_wins_cards', 'p2_wins_cards', 'draws_cards', df)
     else:
-        raise ValueError("Invalid input: must be 'Tricks' or 'Cards'")
-    
+        df = calculate('p1_wins_cards', 'p2_wins_cards', 'draws_cards', df)
+
     # Create value and annotation matrices
     value_matrix, annotation_matrix = matrix(df)
 
@@ -183,8 +259,11 @@ def make_heatmap(df_folder: str, heatmap_folder: str, t_or_c: str = 'Tricks'):
     cmap.set_bad(color='lightgray')
     masked_matrix = value_matrix.mask(value_matrix == -1)
 
-    # Create the heatmap figure
-    plt.figure(figsize=(10, 8))
+    # Create the heatmap figure, keeping the cell size of the 8 x 8 matrix
+    if figsize is None:
+        scale = max(1.0, len(value_matrix) / 8)
+        figsize = (10 * scale, 8 * scale)
+    plt.figure(figsize=figsize)
     ax = sns.heatmap(
         masked_matrix,
         annot=annotation_matrix,
@@ -207,17 +286,25 @@ def make_heatmap(df_folder: str, heatmap_folder: str, t_or_c: str = 'Tricks'):
     plt.tight_layout()
 
     # Save the figure as an SVG file
-    plt.savefig(f"{heatmap_folder}/By{t_or_c}.svg", format="svg")
+    plt.savefig(f"{heatmap_folder}/{figure_name}", format="svg")
+    plt.close()
+
+    # Remember what this figure was rendered from
+    cache = load_render_cache(heatmap_folder)
+    cache[figure_name] = key
+    save_render_cache(heatmap_folder, cache)
+    return True
 
 
-def heatmap(df_folder: str, heatmap_folder: str):
+def heatmap(df_folder: str, heatmap_folder: str, force: bool = False):
     """
     Generates both Trick-based and Card-based heatmaps for the scoring data.
 
     Parameters:
         df_folder (str): Folder containing scoring analysis CSV file.
         heatmap_folder (str): Folder to save heatmaps.
+        force (bool): Render even if the cached heatmaps are up to date.
     """
-    make_heatmap(df_folder, heatmap_folder, 'Tricks')
-    make_heatmap(df_folder, heatmap_folder, 'Cards')
+    make_heatmap(df_folder, heatmap_folder, 'Tricks', force=force)
+    make_heatmap(df_folder, heatmap_folder, 'Cards', force=force)
     return
\ No newline at end of file
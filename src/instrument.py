@@ -0,0 +1,175 @@
+import io
+import json
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# ----------------------------------------------------------
+# Stage Timers, Progress and Metrics
+# ----------------------------------------------------------
+#
+# A stages dict maps a stage name (load, decode, score, aggregate, accumulate,
+# save, rename, generate, write) to {"seconds": float, "calls": int}. Timing a
+# stage costs two perf_counter calls, and stages are timed per file or per chunk,
+# never per deck, so the timers cost microseconds against the seconds of work.
+# Passing stages=None turns a timer into a no-op.
+
+
+@contextmanager
+def timed(stages: dict | None, name: str):
+    """
+    Add the wall-clock time spent inside the with block to stage name of stages.
+    """
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage = stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        stage["seconds"] += time.perf_counter() - start
+        stage["calls"] += 1
+
+
+def merge_stages(stages: dict, other: dict) -> dict:
+    """
+    Add the timings of other (e.g. returned by a worker process) to stages in place.
+    """
+    for name, stage in other.items():
+        total = stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        total["seconds"] += stage["seconds"]
+        total["calls"] += stage["calls"]
+    return stages
+
+
+def stage_seconds(stages: dict) -> dict:
+    """
+    Seconds per stage, rounded for reports and metrics records.
+    """
+    return {name: round(stage["seconds"], 6) for name, stage in stages.items()}
+
+
+def format_stages(stages: dict) -> str:
+    """
+    One line with the time spent in every stage and its share of the total.
+    """
+    total = sum(stage["seconds"] for stage in stages.values())
+    if total <= 0:
+        return "no stages timed"
+    return ", ".join(
+        f"{name} {stage['seconds']:.2f}s ({stage['seconds'] / total:.0%})"
+        for name, stage in sorted(stages.items(), key=lambda item: -item[1]["seconds"])
+    )
+
+
+# ----------------------------------------------------------
+# Progress Line
+# ----------------------------------------------------------
+
+def new_progress(total: int, min_interval: float = 0.5) -> dict:
+    """
+    State of a progress line over total decks, redrawn at most every min_interval seconds.
+    """
+    return {"total": total, "start": time.perf_counter(), "last": float("-inf"), "min_interval": min_interval}
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Seconds as h:mm:ss.
+    """
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def report_progress(progress: dict, done: int, force: bool = False, label: str = "Processed"):
+    """
+    Redraw the progress line with the decks done so far, decks/s and the ETA,
+    unless it was drawn less than min_interval seconds ago (force always draws).
+    """
+    now = time.perf_counter()
+    if not force and now - progress["last"] < progress["min_interval"]:
+        return
+    progress["last"] = now
+
+    total = progress["total"]
+    elapsed = now - progress["start"]
+    rate = done / elapsed if elapsed > 0 else 0.0
+    percent = done / total * 100 if total else 100.0
+    eta = format_duration((total - done) / rate) if rate > 0 else "?"
+    print(f"{label} {done}/{total} decks ({percent:.2f}%) | {rate:,.0f} decks/s | ETA {eta}   ",
+          end="\r", flush=True)
+
+
+# ----------------------------------------------------------
+# Metrics File
+# ----------------------------------------------------------
+
+def open_metrics(path: str | None):
+    """
+    Open a JSON lines metrics file for appending, or return None when path is None.
+    """
+    return None if path is None else open(path, "a")
+
+
+def write_metrics(metrics_file, record: dict):
+    """
+    Append one timestamped record to an open metrics file (no-op when it is None).
+    """
+    if metrics_file is None:
+        return
+    record = {"time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"), **record}
+    metrics_file.write(json.dumps(record) + "\n")
+    metrics_file.flush()
+
+
+# ----------------------------------------------------------
+# Profiling Hook
+# ----------------------------------------------------------
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+def profile_call(fun, *args, mode: str = "cprofile", top: int = 25, **kwargs) -> tuple:
+    """
+    Call fun(*args, **kwargs) under cProfile or tracemalloc.
+
+    Parameters:
+        fun: function to profile
+        mode (str): 'cprofile' for the functions taking the most cumulative time,
+                    'tracemalloc' for the lines allocating the most memory
+        top (int): number of entries in the report
+
+    Raises:
+        ValueError: If mode is not one of PROFILE_MODES
+
+    Returns:
+        tuple: (result of fun, text report)
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fun, *args, **kwargs)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+        return result, report.getvalue()
+
+    if mode == "tracemalloc":
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            result = fun(*args, **kwargs)
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not already_tracing:
+                tracemalloc.stop()
+        lines = [f"current {current / 1_000_000:.2f} MB, peak {peak / 1_000_000:.2f} MB", ""]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:top]]
+        return result, "\n".join(lines)
+
+    raise ValueError(f"Invalid profile mode: must be one of {', '.join(PROFILE_MODES)}")
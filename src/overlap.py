@@ -0,0 +1,309 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.datageneration import plan_files, timed_write_file, record_seeds
+from src.scoring import (
+    check_or_create_wins_df, results_to_array, array_to_results, save_dataframe_to_csv,
+    check_or_create_margins, save_margins, score_batch, load_deck_file, raw_composition, count_raw_decks,
+    rename_raw_to_cooked, num_of_twins, prepare_engine, timed_score_file,
+)
+from src.instrument import (
+    timed, merge_stages, stage_seconds, format_stages, new_progress, report_progress, open_metrics, write_metrics,
+)
+
+# ----------------------------------------------------------
+# Overlapped Generate / Load / Score Pipeline
+# ----------------------------------------------------------
+#
+# make_files, analyze and heatmap run one after another, and analyze only loads a
+# file once the previous one is scored. Here every stage runs at the same time and
+# hands deck files on through bounded queues:
+#
+#   producer ──files──> loaders ──decks──> scorers ──results──> reducer
+#
+#   producer   one thread; writes the deck files in a pool of generator processes
+#              (or just lists existing raw files)
+#   loaders    threads that read upcoming deck files ahead of the scorers
+#   scorers    threads that score loaded decks, or with more than one scorer
+#              send the file paths to a pool of scorer processes that each load
+#              their own file, so no deck array is pickled between processes
+#   reducer    the calling thread; the only one that touches the cumulative
+#              counts and margins, renames scored files and reports progress
+#
+# A stage waits while the queue after it is full, so a fast producer or loader
+# can't run more than `prefetch` files ahead of the slowest stage and at most
+# prefetch files per queue plus one per thread are in memory. Generation, disk I/O
+# and scoring overlap, so the wall time approaches the slowest stage instead of
+# the sum of the stages. An exception in any stage is passed to the reducer, which
+# stops every thread and raises it.
+
+# ends a stage thread, returned by get once the pipeline is stopped
+STOP = object()
+
+# seconds between checks of the stop event while a queue is full or empty
+POLL_INTERVAL = 0.1
+
+
+def put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    Put item on a bounded queue, waiting while it is full, unless the pipeline stops first.
+
+    Returns:
+        bool: True if the item was put on the queue
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def get(q: queue.Queue, stop: threading.Event):
+    """
+    Take the next item from a queue, waiting while it is empty, or STOP once the pipeline stops.
+    """
+    while not stop.is_set():
+        try:
+            return q.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            pass
+    return STOP
+
+
+def run_stage(work, inbox: queue.Queue, outbox: queue.Queue, results: queue.Queue, stop: threading.Event):
+    """
+    Body of a loader or scorer thread: put work(item) on outbox for every item
+    taken from inbox until the pipeline stops. An exception is sent to the reducer.
+    """
+    while True:
+        item = get(inbox, stop)
+        if item is STOP:
+            return
+        try:
+            out = work(item)
+        except Exception as err:
+            put(results, err, stop)
+            return
+        if not put(outbox, out, stop):
+            return
+
+
+def start_threads(target, count: int, *args) -> list[threading.Thread]:
+    """
+    Start count daemon threads running target(*args).
+    """
+    threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def written_files(sizes: list[int], seed_seqs: list, filepaths: list[str], packed: bool = False,
+                  num_red: int = 26, num_black: int = 26, generators: int = 1):
+    """
+    Write the planned deck files in generators processes and yield (filepath, stages)
+    for each one in order. At most generators files are in the making at once, and
+    no new one is started until the oldest one is taken.
+    """
+    with ProcessPoolExecutor(max_workers=generators) as executor:
+        pending = deque()
+        try:
+            for num_of_decks, seed_seq, filepath in zip(sizes, seed_seqs, filepaths):
+                pending.append(executor.submit(timed_write_file, num_of_decks, seed_seq, filepath, packed,
+                                               num_red, num_black))
+                if len(pending) >= generators:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def overlapped_analyze(produce, filenames: list[str], tot_decks: int, data_folder: str, df_folder: str,
+                       combos: list, num_red: int, num_black: int, engine: str = "window", loaders: int = 1, scorers: int = 1,
+                       prefetch: int = 2, antithetic: bool = False, reverse: bool = False,
+                       metrics_path: str | None = None) -> int:
+    """
+    Score the deck files produce(emit) emits with overlapped loader and scorer stages,
+    and save/update the cumulative DataFrame and margins like analyze.
+
+    Parameters:
+        produce: function called in the producer thread with an emit function, which
+                 it calls with (filename, stages) for every deck file in data_folder once
+                 the file is ready; emit returns False when the pipeline has stopped
+        filenames (list[str]): the raw files produce will emit
+        tot_decks (int): decks in those files, for the progress line
+        num_red (int): red cards in every deck
+        num_black (int): black cards in every deck
+        loaders (int): threads reading deck files ahead of the scorers; with more
+                       than one scorer the scorer processes read the files instead
+        scorers (int): threads scoring loaded decks, each in its own process when more than one
+        prefetch (int): largest number of files waiting in each queue
+
+    Returns:
+        int: the number of games in the saved results
+    """
+    df, num_of_decks_scored = check_or_create_wins_df(df_folder, combos, num_red, num_black)
+    totals = results_to_array(df, combos)
+    margins, num_of_games_in_margins = check_or_create_margins(df_folder, combos, num_of_decks_scored,
+                                                               num_red + num_black)
+
+    files = queue.Queue(maxsize=prefetch)
+    loaded = queue.Queue(maxsize=prefetch)
+    results = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def producer():
+        try:
+            produce(lambda item: put(files, item, stop))
+        except Exception as err:
+            put(results, err, stop)
+
+    score_pool = None
+    if scorers > 1:
+        prepare_engine(engine)
+        score_pool = ProcessPoolExecutor(max_workers=scorers)
+
+    def load(item):
+        filename, file_stages = item
+        if score_pool is not None:
+            # scorer processes load their own file, like analyze's workers
+            return filename, None, file_stages
+        with timed(file_stages, "load"):
+            decks = load_deck_file(os.path.join(data_folder, filename))
+        return filename, decks, file_stages
+
+    def score(item):
+        filename, decks, file_stages = item
+        if score_pool is None:
+            counts, num_of_games, file_margins = score_batch(decks, combos, engine, antithetic, reverse, file_stages)
+        else:
+            counts, num_of_games, file_margins, scored_stages = score_pool.submit(
+                timed_score_file, os.path.join(data_folder, filename), combos, engine, antithetic, reverse).result()
+            merge_stages(file_stages, scored_stages)
+        return filename, counts, num_of_games, file_margins, file_stages
+
+    twins = num_of_twins(antithetic, reverse)
+    total_decks_processed = 0
+    stages = {}
+    progress = new_progress(tot_decks)
+    metrics_file = open_metrics(metrics_path)
+
+    threads = start_threads(producer, 1)
+    threads += start_threads(run_stage, loaders, load, files, loaded, results, stop)
+    threads += start_threads(run_stage, scorers, score, loaded, results, results, stop)
+    try:
+        # The reducer: the only place the cumulative counts are changed
+        for _ in range(len(filenames)):
+            item = get(results, stop)
+            if isinstance(item, Exception):
+                raise item
+            filename, counts, num_of_games, file_margins, file_stages = item
+
+            with timed(file_stages, "accumulate"):
+                totals += counts
+                margins += file_margins
+                num_of_games_in_margins += num_of_games
+            total_decks_processed += num_of_games // twins
+            num_of_decks_scored += num_of_games
+
+            with timed(file_stages, "rename"):
+                rename_raw_to_cooked(data_folder, filename)
+
+            merge_stages(stages, file_stages)
+            write_metrics(metrics_file, {"event": "file", "filename": filename, "decks": num_of_games // twins,
+                                         "stages": stage_seconds(file_stages)})
+            report_progress(progress, total_decks_processed)
+
+        report_progress(progress, total_decks_processed, force=True)
+        print()
+
+        with timed(stages, "save"):
+            save_dataframe_to_csv(array_to_results(totals, combos), df_folder, num_of_decks_scored,
+                                  num_red, num_black)
+            save_margins(margins, df_folder, combos, num_of_games_in_margins)
+
+        elapsed = time.perf_counter() - progress["start"]
+        write_metrics(metrics_file, {"event": "summary", "decks": total_decks_processed, "files": len(filenames),
+                                     "seconds": round(elapsed, 6), "decks_per_second": total_decks_processed / elapsed,
+                                     "engine": engine, "loaders": loaders, "scorers": scorers, "prefetch": prefetch,
+                                     "stages": stage_seconds(stages)})
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if score_pool is not None:
+            score_pool.shutdown(cancel_futures=True)
+        if metrics_file is not None:
+            metrics_file.close()
+
+    stage_total = sum(stage["seconds"] for stage in stages.values())
+    print(f"Stages: {format_stages(stages)}")
+    print(f"Overlap: {stage_total:.2f}s of stage time in {elapsed:.2f}s wall time")
+    print(f"Total decks scored: {num_of_decks_scored}")
+    return num_of_decks_scored
+
+
+def pipelined_analyze(data_folder: str, df_folder: str, combos: list, engine: str = "window",
+                      loaders: int = 1, scorers: int = 1, prefetch: int = 2, antithetic: bool = False,
+                      reverse: bool = False, metrics_path: str | None = None):
+    """
+    analyze with the next raw files loaded while the current one is scored
+    (see overlapped_analyze). Gives the same results as analyze.
+    """
+    raw_files = sorted([f for f in os.listdir(data_folder) if "raw" in f and os.path.isfile(os.path.join(data_folder, f))])
+    if not raw_files:
+        print("No raw files found to process.")
+        return
+    num_red, num_black = raw_composition(data_folder, raw_files)
+    tot_decks = count_raw_decks(data_folder)
+
+    def produce(emit):
+        for filename in raw_files:
+            if not emit((filename, {})):
+                return
+
+    overlapped_analyze(produce, raw_files, tot_decks, data_folder, df_folder, combos, num_red, num_black, engine,
+                       loaders, scorers, prefetch, antithetic, reverse, metrics_path)
+
+
+def pipelined_augment(tot_n: int, data_folder: str, df_folder: str, combos: list, max_decks: int = 10000,
+                      generators: int = 1, loaders: int = 1, scorers: int = 1, prefetch: int = 2,
+                      engine: str = "window", packed: bool = False, entropy: int | None = None,
+                      file_format: str = "npy", antithetic: bool = False, reverse: bool = False,
+                      num_red: int = 26, num_black: int = 26, metrics_path: str | None = None):
+    """
+    make_files followed by analyze, overlapped: each file is loaded and scored as soon
+    as it is written while the next ones are generated (see overlapped_analyze).
+
+    The files and seed manifest are the same as make_files writes, and the results
+    the same as make_files then analyze, except that raw files already in data_folder
+    are left for the next analyze.
+
+    Parameters:
+        generators (int): processes generating and writing deck files
+        (see make_files and overlapped_analyze for the other arguments)
+
+    Returns:
+        list[str]: paths of the generated (now cooked) files
+    """
+    sizes, seed_seqs, filepaths, records = plan_files(tot_n, data_folder, max_decks, packed, entropy, file_format,
+                                                      num_red, num_black)
+
+    def produce(emit):
+        for filepath, file_stages in written_files(sizes, seed_seqs, filepaths, packed, num_red, num_black, generators):
+            if not emit((os.path.basename(filepath), file_stages)):
+                return
+
+    overlapped_analyze(produce, [os.path.basename(path) for path in filepaths], tot_n, data_folder, df_folder,
+                       combos, num_red, num_black, engine, loaders, scorers, prefetch, antithetic, reverse,
+                       metrics_path)
+    record_seeds(data_folder, records)
+    return filepaths
@@ -0,0 +1,252 @@
+import os
+import time
+
+import numpy as np
+
+from src.datageneration import (
+    generate_decks, num_of_decks_per_file, savefile,
+    find_next_seed, load_root_entropy, record_seeds,
+)
+from src.bitpacked import pack_decks
+from src.storage import save_packed, PACKED_EXTENSION
+from src.scoring import (
+    check_or_create_wins_df, results_to_array, array_to_results, save_dataframe_to_csv,
+    score_batch, confidence_intervals, add_confidence_intervals, num_of_twins,
+    twin_outcome_sums, twin_estimates, SCORE_COLUMNS,
+    check_or_create_margins, save_margins,
+)
+
+
+def filepath_cooked(seed: int, num_of_decks: int, PATH_DATA: str, extension: str = ".npy") -> str:
+    """
+    generate the file name of decks that were scored as they were generated
+    """
+    filename = f'cooked-deck_seed{seed}_num_of_decks{num_of_decks}{extension}'
+    return os.path.join(PATH_DATA, filename)
+
+
+def stream_analyze(tot_decks: int, df_folder: str, combos: list, chunk_size: int = 10000,
+                   engine: str = "window", archive_folder: str | None = None, packed: bool = False,
+                   entropy: int | None = None, file_format: str = "npy",
+                   antithetic: bool = False, reverse: bool = False, num_red: int = 26, num_black: int = 26):
+    """
+    Generate decks in chunks and score them straight away, without writing them to disk.
+
+    Each chunk is generated, scored and added to the cumulative counts before the next
+    one is made, so peak memory depends on chunk_size and not on tot_decks. Only the
+    results table is saved, unless archive_folder is given.
+
+    Parameters:
+        tot_decks (int): number of decks to generate and score
+        df_folder (str): folder of the scoring_analysis_N=*.csv results table
+        combos (list): a list of all the combinations of players' choices
+        chunk_size (int): number of decks generated and scored at a time
+        engine (str): name of the scoring engine in ENGINES
+        archive_folder (str | None): if given, every chunk is also saved there as a
+                                     cooked-deck_* file and listed in the seed manifest
+        packed (bool): save archived chunks as uint64 masks
+        file_format (str): 'npy' or 'pkd', storage format of archived chunks
+        antithetic (bool): also count every deck's color complement (see score_batch)
+        reverse (bool): also count every deck dealt in reverse order
+        num_red (int): red cards in every deck
+        num_black (int): black cards in every deck
+        entropy (int | None): root entropy of the chunk seed streams, by default the
+                              archive's root or fresh OS entropy; the streams are also
+                              keyed by the number of games already in the table
+
+    Raises:
+        ValueError: If packed is True for decks other than 26 red and 26 black cards,
+                    or the results in df_folder are for decks of another composition
+
+    Returns:
+        np.ndarray: the cumulative (len(combos), 6) counts that were saved
+    """
+    if archive_folder is not None and packed and file_format == "npy" and (num_red, num_black) != (26, 26):
+        raise ValueError("uint64 masks only hold 26 red and 26 black cards, use file_format 'pkd' for other decks")
+    df, num_of_decks_scored = check_or_create_wins_df(df_folder, combos, num_red, num_black)
+    totals = results_to_array(df, combos)
+    margins, num_of_games_in_margins = check_or_create_margins(df_folder, combos, num_of_decks_scored,
+                                                               num_red + num_black)
+
+    # chunk seeds follow on from the archive's files so archived chunks are regenerable
+    seed = 0
+    if archive_folder is not None:
+        os.makedirs(archive_folder, exist_ok=True)
+        seed = find_next_seed(archive_folder)
+        if entropy is None:
+            entropy = load_root_entropy(archive_folder)
+    # the table is cumulative, so the streams also follow on from the games already
+    # in it and a run with the same entropy as an earlier one deals new decks
+    root = np.random.SeedSequence(entropy, spawn_key=(num_of_decks_scored,), n_children_spawned=seed)
+    if archive_folder is None:
+        print(f"Root entropy of this run: {root.entropy} (spawn key {root.spawn_key})")
+
+    full_chunks, leftover = num_of_decks_per_file(tot_n=tot_decks, max_decks=chunk_size)
+    total_decks_processed = 0
+
+    for chunk_idx in range(full_chunks + (leftover != 0)):
+        num_of_decks = chunk_size if chunk_idx < full_chunks else leftover
+        seed_seq = root.spawn(1)[0]
+
+        decks = generate_decks(num_of_decks, seed_seq, num_red=num_red, num_black=num_black)
+        counts, num_of_games, chunk_margins = score_batch(decks, combos, engine, antithetic, reverse)
+        totals += counts
+        margins += chunk_margins
+        num_of_games_in_margins += num_of_games
+
+        if archive_folder is not None:
+            if file_format == "pkd":
+                filepath = filepath_cooked(seed + chunk_idx, num_of_decks, archive_folder, PACKED_EXTENSION)
+                save_packed(decks, filepath)
+            else:
+                filepath = filepath_cooked(seed + chunk_idx, num_of_decks, archive_folder)
+                savefile([pack_decks(decks) if packed else decks], filepath)
+            record_seeds(archive_folder, [{
+                "filename": os.path.basename(filepath).replace("cooked-deck", "raw-deck", 1),
+                "entropy": root.entropy,
+                "spawn_key": list(seed_seq.spawn_key),
+                "num_of_decks": num_of_decks,
+                "packed": packed and file_format == "npy",
+                "num_red": num_red,
+                "num_black": num_black,
+            }])
+
+        total_decks_processed += num_of_decks
+        num_of_decks_scored += num_of_games
+
+        progress_percent = (total_decks_processed / tot_decks) * 100
+        print(f"Processed {total_decks_processed}/{tot_decks} decks ({progress_percent:.2f}%)", end='\r', flush=True)
+
+    save_dataframe_to_csv(array_to_results(totals, combos), df_folder, num_of_decks_scored, num_red, num_black)
+    save_margins(margins, df_folder, combos, num_of_games_in_margins)
+    print(f"Total decks scored: {num_of_decks_scored}")
+    return totals
+
+
+def run_until_precision(df_folder: str, combos: list, target_half_width: float = 0.005,
+                        time_budget: float | None = None, max_decks: int | None = None,
+                        confidence: float = 0.95, chunk_size: int = 10000, engine: str = "window",
+                        entropy: int | None = None, antithetic: bool = False, reverse: bool = False,
+                        num_red: int = 26, num_black: int = 26):
+    """
+    Generate and score decks until every win and draw rate is known precisely enough.
+
+    Batches of chunk_size decks are streamed through the scorer like stream_analyze.
+    After each batch a Wilson interval is computed for every rate in the cumulative
+    table (including games already in it), and the run stops as soon as every
+    interval's half-width is at most target_half_width, or time_budget seconds have
+    passed, or max_decks decks were added. The intervals are saved in the results
+    CSV as '<column>_ci_low' and '<column>_ci_high' columns, and the margins are
+    saved next to it like stream_analyze does.
+
+    With antithetic and/or reverse every deck also counts as its twins (see
+    score_batch). N in the results table counts every twin as a game, but twins
+    are correlated, so the intervals are only as narrow as the number of
+    independent decks allows (see confidence_intervals).
+
+    Parameters:
+        df_folder (str): folder of the scoring_analysis_N=*.csv results table
+        combos (list): a list of all the combinations of players' choices
+        target_half_width (float): largest allowed interval half-width, e.g. 0.005 for +-0.5%
+        time_budget (float | None): wall-clock limit in seconds
+        max_decks (int | None): most decks to add in this run
+        confidence (float): confidence level of the intervals
+        chunk_size (int): number of decks generated and scored at a time
+        engine (str): name of the scoring engine in ENGINES
+        entropy (int | None): root entropy of the batch seed streams, which are
+                              also keyed by the number of games already in the table
+        antithetic (bool): also count every deck's color complement
+        reverse (bool): also count every deck dealt in reverse order
+        num_red (int): red cards in every deck
+        num_black (int): black cards in every deck
+
+    Raises:
+        ValueError: If the results in df_folder are for decks of another composition
+
+    Returns:
+        tuple[np.ndarray, int]: the cumulative (len(combos), 6) counts and the total number of games
+    """
+    df, num_of_decks_scored = check_or_create_wins_df(df_folder, combos, num_red, num_black)
+    totals = results_to_array(df, combos)
+    margins, num_of_games_in_margins = check_or_create_margins(df_folder, combos, num_of_decks_scored,
+                                                               num_red + num_black)
+
+    # the table is cumulative, so the streams follow on from the games already in it
+    # and a run with the same entropy as an earlier one deals new decks
+    root = np.random.SeedSequence(entropy, spawn_key=(num_of_decks_scored,))
+    print(f"Root entropy of this run: {root.entropy} (spawn key {root.spawn_key})")
+
+    started = time.perf_counter()
+    decks_added = 0
+    twins = num_of_twins(antithetic, reverse)
+
+    while True:
+        low, high = confidence_intervals(totals, num_of_decks_scored, confidence, twins)
+        widest = float(((high - low) / 2).max())
+        print(f"{num_of_decks_scored // twins} decks, widest interval +-{widest:.4f}", end='\r', flush=True)
+
+        if widest <= target_half_width:
+            print(f"\nReached +-{target_half_width} after {num_of_decks_scored // twins} decks "
+                  f"({num_of_decks_scored} games).")
+            break
+        if time_budget is not None and time.perf_counter() - started >= time_budget:
+            print(f"\nTime budget of {time_budget}s used up.")
+            break
+        if max_decks is not None and decks_added >= max_decks:
+            print(f"\nAdded the maximum of {max_decks} decks.")
+            break
+
+        num_of_decks = chunk_size if max_decks is None else min(chunk_size, max_decks - decks_added)
+        decks = generate_decks(num_of_decks, root.spawn(1)[0], num_red=num_red, num_black=num_black)
+        counts, num_of_games, batch_margins = score_batch(decks, combos, engine, antithetic, reverse)
+        totals += counts
+        margins += batch_margins
+        num_of_games_in_margins += num_of_games
+        decks_added += num_of_decks
+        num_of_decks_scored += num_of_games
+
+    df = add_confidence_intervals(array_to_results(totals, combos), num_of_decks_scored, confidence, twins)
+    save_dataframe_to_csv(df, df_folder, num_of_decks_scored, num_red, num_black)
+    save_margins(margins, df_folder, combos, num_of_games_in_margins)
+    return totals, num_of_decks_scored
+
+
+def stream_estimates(tot_decks: int, combos: list, chunk_size: int = 10000, engine: str = "window",
+                     entropy: int | None = None, antithetic: bool = True, reverse: bool = False,
+                     num_red: int = 26, num_black: int = 26):
+    """
+    Generate tot_decks decks in chunks and estimate every win/loss/draw rate with
+    each deck averaged over its twins, with standard errors that take the
+    correlation between twins into account (see symmetric_estimates).
+
+    Unlike stream_analyze nothing is added to the results table: the estimates
+    show how much the twins narrow the standard errors compared with plain
+    sampling of the same number of decks.
+
+    Raises:
+        ValueError: If antithetic is True and the decks are not balanced
+
+    Returns:
+        pd.DataFrame: see twin_estimates
+    """
+    root = np.random.SeedSequence(entropy)
+    print(f"Root entropy of this run: {root.entropy}")
+
+    sums = np.zeros((len(combos), len(SCORE_COLUMNS)))
+    squares = np.zeros((len(combos), len(SCORE_COLUMNS)))
+    full_chunks, leftover = num_of_decks_per_file(tot_n=tot_decks, max_decks=chunk_size)
+    total_decks_processed = 0
+
+    for chunk_idx in range(full_chunks + (leftover != 0)):
+        num_of_decks = chunk_size if chunk_idx < full_chunks else leftover
+        decks = generate_decks(num_of_decks, root.spawn(1)[0], num_red=num_red, num_black=num_black)
+        chunk_sums, chunk_squares = twin_outcome_sums(decks, combos, engine, antithetic, reverse)
+        sums += chunk_sums
+        squares += chunk_squares
+
+        total_decks_processed += num_of_decks
+        progress_percent = (total_decks_processed / tot_decks) * 100
+        print(f"Processed {total_decks_processed}/{tot_decks} decks ({progress_percent:.2f}%)", end='\r', flush=True)
+    print()
+
+    return twin_estimates(sums, squares, tot_decks, combos)
@@ -2,6 +2,19 @@ import pandas as pd
 import numpy as np
 import os
 import re
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+
+from src.automaton import score_decks_fsa
+from src.bitpacked import DECK_SIZE, pack_decks, unpack_decks, score_decks_packed
+from src.chunked import score_decks_chunked, load_chunk_tables
+from src.storage import PACKED_EXTENSION, load_packed, load_packed_masks, load_packed_rows, read_header, rows_to_decks
+from src.instrument import (
+    timed, merge_stages, stage_seconds, format_stages, new_progress, report_progress,
+    open_metrics, write_metrics, profile_call,
+)
 
 def load_first_raw_file(path: str) -> tuple[np.ndarray, str]:
     """
@@ -54,6 +67,26 @@ def count_raw_files(path: str) -> int:
     return count
 
 
+def count_raw_decks(path: str) -> int:
+    """
+    Count the decks in the raw files of the given folder from the
+    'num_of_decks{n}' part of their filenames, without opening them.
+
+    Parameters:
+        path (str): Folder path to search.
+
+    Returns:
+        int: Total number of decks in the raw files.
+    """
+    pattern = re.compile(r"^raw-deck_seed\d+_num_of_decks(\d+)\.")
+    count = 0
+    for fname in os.listdir(path):
+        match = pattern.match(fname)
+        if match and os.path.isfile(os.path.join(path, fname)):
+            count += int(match.group(1))
+
+    return count
+
 
 # once read, change name
 def rename_raw_to_cooked(path: str, filename: str) -> str:
@@ -90,7 +123,32 @@ def rename_raw_to_cooked(path: str, filename: str) -> str:
 
     return new_name
 
-def check_or_create_wins_df(folder: str, combos: list[dict]) -> pd.DataFrame:
+# The composition of the scored decks is saved next to the results table under this name
+COMPOSITION_FILENAME = "scoring_composition.json"
+
+def load_composition(folder: str) -> tuple[int, int]:
+    """
+    (red, black) cards of the decks in the results table saved in folder. Tables
+    saved before the composition was recorded are of standard 26/26 decks.
+    """
+    filepath = os.path.join(folder, COMPOSITION_FILENAME)
+    if not os.path.exists(filepath):
+        return 26, 26
+    with open(filepath) as f:
+        composition = json.load(f)
+    return composition["num_red"], composition["num_black"]
+
+def save_composition(folder: str, num_red: int, num_black: int) -> None:
+    """
+    Save the composition of the scored decks as 'scoring_composition.json' next to the results table.
+    """
+    os.makedirs(folder, exist_ok=True)
+    temp_filepath = os.path.join(folder, "scoring_composition_temp.json")
+    with open(temp_filepath, "w") as f:
+        json.dump({"num_red": num_red, "num_black": num_black}, f)
+    os.replace(temp_filepath, os.path.join(folder, COMPOSITION_FILENAME))
+
+def check_or_create_wins_df(folder: str, combos: list[dict], num_red: int = 26, num_black: int = 26) -> pd.DataFrame:
     base_filename = "scoring_analysis"
     pattern = re.compile(rf"{base_filename}_N=\d+\.csv")
     
@@ -104,6 +162,18 @@ def check_or_create_wins_df(folder: str, combos: list[dict]) -> pd.DataFrame:
         filepath = os.path.join(folder, found_file)
         print(f"Found existing file: {filepath}. Loading DataFrame.")
         df = pd.read_csv(filepath, dtype={"p1": str, "p2": str})
+
+        # a table of 3-card results cannot be continued with 4-card combos
+        saved_length = df["p1"].str.len().max()
+        if saved_length != pattern_length(combos):
+            raise ValueError(f"{filepath} holds {saved_length}-card patterns, "
+                             f"but the combos are {pattern_length(combos)}-card patterns")
+
+        # nor can a table of 26/26 decks be continued with decks of another composition
+        saved_red, saved_black = load_composition(folder)
+        if (saved_red, saved_black) != (num_red, num_black):
+            raise ValueError(f"{filepath} holds decks of {saved_red} red and {saved_black} black cards, "
+                             f"not {num_red} red and {num_black} black cards")
     
         n_match = re.search(r"_N=(\d+)", found_file)
         decks_scored = int(n_match.group(1)) if n_match else 0
@@ -152,22 +222,23 @@ def score_deck(deck: np.ndarray, combos: list) -> pd.DataFrame:
         p2_tricks = 0
         p2_cards = 0
 
+        k = len(p1)  # cards per pattern
         i = 0  # starting position in deck_str
-        cards_to_win = 3
+        cards_to_win = k
 
-        while i <= len(deck_str) - 3:
-            window = deck_str[i:i+3]
+        while i <= len(deck_str) - k:
+            window = deck_str[i:i+k]
 
             if window == p1:
                 p1_tricks += 1
                 p1_cards += cards_to_win
-                i += 3  # skip next 3 cards
-                cards_to_win = 3
+                i += k  # skip next k cards
+                cards_to_win = k
             elif window == p2:
                 p2_tricks += 1
                 p2_cards += cards_to_win
-                i += 3  # skip next 3 cards
-                cards_to_win = 3
+                i += k  # skip next k cards
+                cards_to_win = k
             else:
                 i += 1  # move window by 1
                 cards_to_win += 1
@@ -185,9 +256,464 @@ def score_deck(deck: np.ndarray, combos: list) -> pd.DataFrame:
     df = pd.DataFrame(rows)
     return df
     
-def save_dataframe_to_csv(df: pd.DataFrame, folder: str, num_of_decks_scored: int) -> None:
+# Shortest pattern length. A trick takes at least as many cards as the patterns,
+# so a deck has at most deck_size // MIN_PATTERN_LENGTH tricks, which is what the
+# trick margin histograms have room for (see margin_limits)
+MIN_PATTERN_LENGTH = 3
+
+def make_combos(pattern_length: int = 3) -> list[dict]:
+    """
+    Every matchup of two different patterns of pattern_length cards, in the
+    order of the results table: 56 for 3 cards, 240 for 4 and 992 for 5.
+
+    Parameters:
+        pattern_length (int): cards per pattern, at least MIN_PATTERN_LENGTH
+
+    Raises:
+        ValueError: If pattern_length is below MIN_PATTERN_LENGTH
+
+    Returns:
+        list[dict]: combos as {"player_a": str, "player_b": str} with patterns
+                    written as binary strings such as '0110'
+    """
+    if pattern_length < MIN_PATTERN_LENGTH:
+        raise ValueError(f"Pattern length must be at least {MIN_PATTERN_LENGTH}, got {pattern_length}")
+    patterns = [format(code, f"0{pattern_length}b") for code in range(1 << pattern_length)]
+    return [{"player_a": a, "player_b": b} for a in patterns for b in patterns if a != b]
+
+def pattern_length(combos: list[dict]) -> int:
+    """
+    Number of cards in the patterns of combos.
+
+    Raises:
+        ValueError: If the patterns have different lengths or are shorter than MIN_PATTERN_LENGTH
+    """
+    lengths = {len(str(combo[player])) for combo in combos for player in ("player_a", "player_b")}
+    if len(lengths) != 1:
+        raise ValueError(f"All patterns must have the same length, got lengths {sorted(lengths)}")
+    length = lengths.pop()
+    if length < MIN_PATTERN_LENGTH:
+        raise ValueError(f"Pattern length must be at least {MIN_PATTERN_LENGTH}, got {length}")
+    return length
+
+def combo_codes(combos: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert the players' choices in combos into integer pattern codes.
+
+    Each k-card pattern such as '101' is read as a binary number, so the
+    8 possible 3-card patterns become the codes 0-7 (0 to 2**k - 1 for k cards).
+
+    Parameters:
+        combos (list): a list of all the combinations of players' choices
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: pattern codes for player 1 and player 2
+    """
+    p1_codes = np.array([int(str(combo["player_a"]), 2) for combo in combos], dtype=np.int64)
+    p2_codes = np.array([int(str(combo["player_b"]), 2) for combo in combos], dtype=np.int64)
+    return p1_codes, p2_codes
+
+def as_deck_array(decks: np.ndarray) -> np.ndarray:
+    """
+    Reshape loaded decks into a 2-D (n, deck_size) boolean array.
+
+    Files written by make_files are stored as (1, n, deck_size) and a single deck
+    may come in as (deck_size,), so both are flattened to (n, deck_size).
+    Packed uint64 decks are unpacked to the same layout (always 52 cards).
+    """
+    decks = np.asarray(decks)
+    if decks.dtype == np.uint64:
+        return unpack_decks(decks)
+    if decks.ndim == 1:
+        decks = decks[np.newaxis, :]
+    elif decks.ndim == 3 and decks.shape[0] == 1:
+        decks = decks[0]
+    return decks.astype(bool, copy=False)
+
+def load_deck_file(full_path: str) -> np.ndarray:
+    """
+    Load a deck file written by make_files.
+
+    Returns:
+        np.ndarray: (n, deck_size) boolean decks, or (n,) uint64 masks for packed
+                    52-card files so the bitwise engine can score them without unpacking
+    """
+    if full_path.endswith(PACKED_EXTENSION):
+        if read_header(full_path)["deck_size"] == DECK_SIZE:
+            return load_packed_masks(full_path)
+        return load_packed(full_path)
+    decks = np.load(full_path)
+    if decks.dtype == np.uint64:
+        return decks.reshape(-1)
+    return as_deck_array(decks)
+
+def deck_size_of(decks: np.ndarray) -> int:
+    """
+    Number of cards in each deck of a deck array, 52 for packed uint64 masks.
+    """
+    decks = np.asarray(decks)
+    return DECK_SIZE if decks.dtype == np.uint64 else decks.shape[-1]
+
+def deck_composition(decks: np.ndarray) -> tuple[int, int]:
+    """
+    (red, black) cards of the first deck of a non-empty deck array. Every deck of a
+    batch is a shuffle of the same base deck, so this is the composition of all of them.
+    """
+    decks = np.asarray(decks)
+    if decks.ndim == 3:
+        decks = decks[0]
+    first = as_deck_array(decks[:1])[0]
+    num_red = int(np.count_nonzero(first))
+    return num_red, first.size - num_red
+
+def deck_file_composition(full_path: str) -> tuple[int, int]:
+    """
+    (red, black) cards of the decks in a deck file, read from its first deck only.
+    """
+    if full_path.endswith(PACKED_EXTENSION):
+        rows, header = load_packed_rows(full_path, 0, 1)
+        return deck_composition(rows_to_decks(rows, header["deck_size"]))
+    return deck_composition(np.load(full_path, mmap_mode="r"))
+
+def raw_composition(data_folder: str, raw_files: list[str]) -> tuple[int, int]:
+    """
+    (red, black) cards of the decks in the raw files, which must all hold decks of one composition.
+
+    Raises:
+        ValueError: If the files hold decks of different compositions
+    """
+    compositions = {deck_file_composition(os.path.join(data_folder, filename)) for filename in raw_files}
+    if len(compositions) != 1:
+        raise ValueError(f"Raw files in {data_folder} hold decks of different compositions "
+                         f"(red, black): {sorted(compositions)}")
+    return compositions.pop()
+
+def window_codes(decks: np.ndarray, pattern_length: int = 3) -> np.ndarray:
+    """
+    Compute the pattern code of every k-card window in every deck.
+
+    Parameters:
+        decks (np.ndarray): (n, 52) array of decks
+        pattern_length (int): cards per window
+
+    Returns:
+        np.ndarray: (n, 52 - k + 1) array of codes 0 to 2**k - 1, window i covers
+                    cards i to i + k - 1 (for 3 cards, (n, 50) codes 0-7)
+    """
+    cards = as_deck_array(decks).astype(np.uint8)
+    if pattern_length == 3:
+        return (cards[:, :-2] << 2) | (cards[:, 1:-1] << 1) | cards[:, 2:]
+
+    num_windows = cards.shape[1] - pattern_length + 1
+    codes = np.zeros((cards.shape[0], num_windows), dtype=np.int64)
+    for j in range(pattern_length):
+        codes = (codes << 1) | cards[:, j:j + num_windows]
+    return codes
+
+def score_decks_window(decks: np.ndarray, p1_codes: np.ndarray, p2_codes: np.ndarray,
+                       pattern_length: int = 3) -> dict[str, np.ndarray]:
+    """
+    Window engine: every deck and every combo is updated together one
+    k-card window position at a time.
+    """
+    k = pattern_length
+    codes = window_codes(decks, k)
+    shape = (codes.shape[0], len(p1_codes))
+
+    p1_tricks = np.zeros(shape, dtype=np.int64)
+    p1_cards = np.zeros(shape, dtype=np.int64)
+    p2_tricks = np.zeros(shape, dtype=np.int64)
+    p2_cards = np.zeros(shape, dtype=np.int64)
+
+    # position where the current pile started, windows before it are skipped
+    start = np.zeros(shape, dtype=np.int64)
+
+    for i in range(codes.shape[1]):
+        window = codes[:, i, np.newaxis]
+        active = start <= i
+        p1_hit = active & (window == p1_codes)
+        p2_hit = active & (window == p2_codes)
+
+        # cards in the pile = cards from the pile start up to the end of this window
+        cards_to_win = i + k - start
+        p1_tricks += p1_hit
+        p1_cards += np.where(p1_hit, cards_to_win, 0)
+        p2_tricks += p2_hit
+        p2_cards += np.where(p2_hit, cards_to_win, 0)
+
+        # skip the k cards of the trick
+        start = np.where(p1_hit | p2_hit, i + k, start)
+
+    return {
+        "p1_tricks": p1_tricks,
+        "p1_cards": p1_cards,
+        "p2_tricks": p2_tricks,
+        "p2_cards": p2_cards,
+    }
+
+def score_decks_automaton(decks: np.ndarray, p1_codes: np.ndarray, p2_codes: np.ndarray,
+                          pattern_length: int = 3) -> dict[str, np.ndarray]:
+    """
+    Automaton engine: every combo is a small state machine and the decks are
+    scored by transition/emit table lookups, one card at a time.
+    """
+    cards = as_deck_array(decks).astype(np.intp)
+    return score_decks_fsa(cards, p1_codes, p2_codes, pattern_length)
+
+def score_decks_bitwise(decks: np.ndarray, p1_codes: np.ndarray, p2_codes: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Bitwise engine: decks are packed into uint64 masks and pattern matches are
+    found with shifts and masks. Packed decks are scored without unpacking.
+    """
+    decks = np.asarray(decks)
+    if decks.dtype != np.uint64:
+        decks = pack_decks(as_deck_array(decks))
+    return score_decks_packed(decks, p1_codes, p2_codes)
+
+def next_occurrence(codes: np.ndarray) -> np.ndarray:
+    """
+    Build the occurrence index of every pattern in one backward pass over the windows.
+
+    Parameters:
+        codes (np.ndarray): (n, num_windows) window codes from window_codes
+
+    Returns:
+        np.ndarray: (n, 8, num_windows + 1) array, entry [d, k, i] is the first window
+                    at or after i whose code is k, or num_windows if there is none
+    """
+    num_decks, num_windows = codes.shape
+    index = np.full((num_decks, 8, num_windows + 1), num_windows, dtype=np.int8)
+    patterns = np.arange(8, dtype=codes.dtype)[np.newaxis, :]
+
+    for i in range(num_windows - 1, -1, -1):
+        index[:, :, i] = np.where(codes[:, i, np.newaxis] == patterns, i, index[:, :, i + 1])
+
+    return index
+
+def score_decks_index(decks: np.ndarray, p1_codes: np.ndarray, p2_codes: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Occurrence index engine: the 50 window codes and the next position of each of
+    the 8 patterns are computed once per deck and shared by all combos. Each combo
+    then jumps straight from one trick to the next, restarting 3 cards after it.
+    """
+    codes = window_codes(decks)
+    index = next_occurrence(codes)
+    num_decks, num_windows = codes.shape
+    shape = (num_decks, len(p1_codes))
+
+    # index rows of each combo's patterns, (n, len(combos), num_windows + 1)
+    p1_next = index[:, p1_codes]
+    p2_next = index[:, p2_codes]
+
+    p1_tricks = np.zeros(shape, dtype=np.int64)
+    p1_cards = np.zeros(shape, dtype=np.int64)
+    p2_tricks = np.zeros(shape, dtype=np.int64)
+    p2_cards = np.zeros(shape, dtype=np.int64)
+
+    # position where the current pile started
+    start = np.zeros(shape, dtype=np.int64)
+
+    while True:
+        position = np.minimum(start, num_windows)[..., np.newaxis]
+        p1_at = np.take_along_axis(p1_next, position, axis=2)[..., 0].astype(np.int64)
+        p2_at = np.take_along_axis(p2_next, position, axis=2)[..., 0].astype(np.int64)
+        i = np.minimum(p1_at, p2_at)
+        live = i < num_windows
+        if not live.any():
+            break
+
+        p1_hit = live & (p1_at < p2_at)
+        p2_hit = live & (p2_at < p1_at)
+
+        cards_to_win = i + 3 - start
+        p1_tricks += p1_hit
+        p1_cards += np.where(p1_hit, cards_to_win, 0)
+        p2_tricks += p2_hit
+        p2_cards += np.where(p2_hit, cards_to_win, 0)
+
+        # skip the 3 cards of the trick
+        start = np.where(live, i + 3, num_windows)
+
+    return {
+        "p1_tricks": p1_tricks,
+        "p1_cards": p1_cards,
+        "p2_tricks": p2_tricks,
+        "p2_cards": p2_cards,
+    }
+
+def score_decks_chunk_tables(decks: np.ndarray, p1_codes: np.ndarray, p2_codes: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Chunked engine: decks are packed into uint64 masks and scored 13 cards per
+    table lookup with the precomputed chunk tables of src.chunked.
+    """
+    decks = np.asarray(decks)
+    if decks.dtype != np.uint64:
+        decks = pack_decks(as_deck_array(decks))
+    return score_decks_chunked(decks, p1_codes, p2_codes)
+
+# Scoring engines available to score_decks, all give identical results
+ENGINES = {
+    "window": score_decks_window,
+    "fsa": score_decks_automaton,
+    "bitwise": score_decks_bitwise,
+    "index": score_decks_index,
+    "chunked": score_decks_chunk_tables,
+}
+
+# Engines that take a pattern_length and score patterns of any length in decks
+# of any size, the others are built around 3-card windows of 52-card decks
+GENERAL_ENGINES = {"window", "fsa"}
+
+def prepare_engine(engine: str) -> None:
+    """
+    Build what an engine caches on disk (the chunked engine's chunk tables) in this
+    process, so worker processes started afterwards load it instead of each building it.
+    """
+    if engine == "chunked":
+        load_chunk_tables()
+
+def score_decks(decks: np.ndarray, combos: list, engine: str = "window") -> dict[str, np.ndarray]:
+    """
+    Scores a whole array of decks for both trick and card scoring at once.
+
+    Gives the same tricks and cards as score_deck, but no per-deck DataFrames
+    are built.
+
+    Parameters:
+        decks (np.ndarray): (n, deck_size) array of decks to score, or (n,) uint64 masks
+        combos (list): a list of all the combinations of players' choices
+                       each combo is a dict: {"player_a": str, "player_b": str}
+        engine (str): name of the scoring engine in ENGINES
+
+    Raises:
+        ValueError: If the engine is not in ENGINES, or the patterns are not 3 cards
+                    long or the decks not 52 cards and the engine is not in GENERAL_ENGINES
+
+    Returns:
+        dict[str, np.ndarray]: (n, len(combos)) integer arrays keyed by
+                               'p1_tricks', 'p1_cards', 'p2_tricks', 'p2_cards'
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Invalid engine: {engine}. Must be one of {sorted(ENGINES)}")
+
+    p1_codes, p2_codes = combo_codes(combos)
+    k = pattern_length(combos)
+    if engine not in GENERAL_ENGINES:
+        if k != 3:
+            raise ValueError(f"Engine {engine} only scores 3-card patterns, use one of {sorted(GENERAL_ENGINES)}")
+        if deck_size_of(decks) != DECK_SIZE:
+            raise ValueError(f"Engine {engine} only scores 52-card decks, use one of {sorted(GENERAL_ENGINES)}")
+        return ENGINES[engine](decks, p1_codes, p2_codes)
+    if k == 3:
+        return ENGINES[engine](decks, p1_codes, p2_codes)
+    return ENGINES[engine](decks, p1_codes, p2_codes, k)
+
+def count_wins_batch(scores: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Given the scores of many decks from score_decks, compute win/loss/draw counts
+    for both game modes (tricks and cards) summed over all decks.
+
+    Returns:
+        dict[str, np.ndarray]: one integer array of length len(combos) per scoring column
+    """
+    wins = {}
+    for mode in ["tricks", "cards"]:
+        p1 = scores[f"p1_{mode}"]
+        p2 = scores[f"p2_{mode}"]
+        wins[f"p1_wins_{mode}"] = np.count_nonzero(p1 > p2, axis=0)
+        wins[f"p2_wins_{mode}"] = np.count_nonzero(p1 < p2, axis=0)
+        wins[f"draws_{mode}"] = np.count_nonzero(p1 == p2, axis=0)
+    return wins
+
+# Margin histograms are saved next to the results table under this name
+MARGINS_FILENAME = "scoring_margins.npz"
+
+# Order of the scoring columns in scoring_analysis_N=*.csv and in the count arrays
+SCORE_COLUMNS = ["p1_wins_cards", "p1_wins_tricks", "p2_wins_cards",
+                 "p2_wins_tricks", "draws_cards", "draws_tricks"]
+
+def wins_to_array(wins: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Stack the win/loss/draw counts from count_wins_batch into a (len(combos), 6)
+    int64 array with columns in SCORE_COLUMNS order.
+    """
+    return np.stack([wins[col] for col in SCORE_COLUMNS], axis=1).astype(np.int64)
+
+def results_to_array(df: pd.DataFrame, combos: list) -> np.ndarray:
+    """
+    Convert a results DataFrame into a (len(combos), 6) int64 array.
+
+    Rows are matched on p1 and p2 and put in the order of combos, combos that are
+    not in the DataFrame start at 0.
+    """
+    combo_index = pd.MultiIndex.from_tuples(
+        [(str(combo["player_a"]), str(combo["player_b"])) for combo in combos], names=["p1", "p2"]
+    )
+    counts = (
+        df.astype({"p1": str, "p2": str})
+        .set_index(["p1", "p2"])[SCORE_COLUMNS]
+        .reindex(combo_index)
+        .fillna(0)
+    )
+    return counts.to_numpy(dtype=np.int64)
+
+def array_to_results(totals: np.ndarray, combos: list) -> pd.DataFrame:
+    """
+    Convert a (len(combos), 6) count array back into the results DataFrame
+    with columns p1, p2 and SCORE_COLUMNS.
+    """
+    df = pd.DataFrame({
+        "p1": [str(combo["player_a"]) for combo in combos],
+        "p2": [str(combo["player_b"]) for combo in combos],
+    })
+    for col_idx, col in enumerate(SCORE_COLUMNS):
+        df[col] = totals[:, col_idx]
+    return df
+
+def confidence_intervals(totals: np.ndarray, num_of_games: int, confidence: float = 0.95,
+                         twins: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Wilson score intervals for every win/loss/draw rate in a count array.
+
+    Each column of a combo's row is treated as a binomial count out of num_of_games,
+    i.e. one category of the combo's win/loss/draw multinomial.
+
+    With twins > 1 every deck was counted as that many games (see num_of_twins).
+    Twins are correlated, so the intervals are as wide as for num_of_games // twins
+    independent decks: the variance of a deck's twin-averaged result is never
+    larger than that of a single game, so these intervals are conservative.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: lower and upper bounds, same shape as totals
+    """
+    num_of_decks = num_of_games / twins
+    if num_of_decks == 0:
+        return np.zeros(totals.shape), np.ones(totals.shape)
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = totals / num_of_games
+    denominator = 1 + z ** 2 / num_of_decks
+    center = (rate + z ** 2 / (2 * num_of_decks)) / denominator
+    half_width = z * np.sqrt(rate * (1 - rate) / num_of_decks + z ** 2 / (4 * num_of_decks ** 2)) / denominator
+    return center - half_width, center + half_width
+
+def add_confidence_intervals(df: pd.DataFrame, num_of_games: int, confidence: float = 0.95,
+                             twins: int = 1) -> pd.DataFrame:
+    """
+    Add '<column>_ci_low' and '<column>_ci_high' rate bounds for every column in
+    SCORE_COLUMNS to a results DataFrame (see confidence_intervals for twins).
+    """
+    low, high = confidence_intervals(df[SCORE_COLUMNS].to_numpy(dtype=np.int64), num_of_games, confidence, twins)
+    for col_idx, col in enumerate(SCORE_COLUMNS):
+        df[f"{col}_ci_low"] = low[:, col_idx]
+        df[f"{col}_ci_high"] = high[:, col_idx]
+    return df
+
+def save_dataframe_to_csv(df: pd.DataFrame, folder: str, num_of_decks_scored: int,
+                          num_red: int = 26, num_black: int = 26) -> None:
     """
-    Safely save DataFrame as 'scoring_analysis_N=###.csv'.
+    Safely save DataFrame as 'scoring_analysis_N=###.csv', with the composition
+    of its decks in 'scoring_composition.json'.
     Keeps the previous file until the new one is fully written.
     """
     base_filename = "scoring_analysis"
@@ -200,6 +726,7 @@ def save_dataframe_to_csv(df: pd.DataFrame, folder: str, num_of_decks_scored: in
 
     # Step 1: Write to temp file
     df.to_csv(temp_filepath, index=False)
+    save_composition(folder, num_red, num_black)
 
     # Step 2: Remove older completed files (but not the new temp)
     for f in os.listdir(folder):
@@ -291,14 +818,414 @@ def update_results(results_df: pd.DataFrame, scores_df: pd.DataFrame) -> pd.Data
 
     return merged
 
-def analyze(data_folder: str, df_folder: str, combos: list, tot_decks: int):
+# Largest trick and card margins (p1 - p2) in a 52-card deck
+MAX_TRICK_MARGIN = 52 // 3
+MAX_CARD_MARGIN = 52
+TRICK_BINS = 2 * MAX_TRICK_MARGIN + 1
+CARD_BINS = 2 * MAX_CARD_MARGIN + 1
+
+def margin_limits(deck_size: int = DECK_SIZE) -> tuple[int, int]:
     """
-    Load all raw deck files, score each deck using combos, and save/update a cumulative DataFrame.
-    Prints cumulative progress over total number of decks.
+    Largest trick and card margins (p1 - p2) in a deck of deck_size cards,
+    (MAX_TRICK_MARGIN, MAX_CARD_MARGIN) for a 52-card deck.
+    """
+    return deck_size // MIN_PATTERN_LENGTH, deck_size
+
+def margin_bins(deck_size: int = DECK_SIZE) -> tuple[int, int]:
+    """
+    Number of trick and card margin bins for decks of deck_size cards,
+    (TRICK_BINS, CARD_BINS) for a 52-card deck.
+    """
+    max_tricks, max_cards = margin_limits(deck_size)
+    return 2 * max_tricks + 1, 2 * max_cards + 1
+
+def margin_histograms(scores: dict[str, np.ndarray], deck_size: int = DECK_SIZE) -> np.ndarray:
+    """
+    Histograms of trick and card margins (p1 - p2) of every combo from score_decks.
+
+    Returns:
+        np.ndarray: (len(combos), trick bins + card bins) int64 counts (see margin_bins),
+                    the first trick bins columns are trick margins -max..max and the
+                    rest are card margins -deck_size..deck_size
+    """
+    num_combos = scores["p1_tricks"].shape[1]
+    combo_idx = np.arange(num_combos)
+
+    histograms = []
+    for mode, bins, offset in zip(["tricks", "cards"], margin_bins(deck_size), margin_limits(deck_size)):
+        margin = scores[f"p1_{mode}"] - scores[f"p2_{mode}"] + offset
+        flat = (combo_idx * bins + margin).reshape(-1)
+        histograms.append(np.bincount(flat, minlength=num_combos * bins).reshape(num_combos, bins))
+
+    return np.concatenate(histograms, axis=1).astype(np.int64)
+
+def split_margins(margins: np.ndarray, deck_size: int = DECK_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Split margin histograms into (trick margins, card margins).
+    """
+    trick_bins, _ = margin_bins(deck_size)
+    return margins[:, :trick_bins], margins[:, trick_bins:]
+
+def margins_deck_size(margins: np.ndarray) -> int:
+    """
+    Deck size of margin histograms, from their number of bins.
+    """
+    for deck_size in range(margins.shape[1] // 3, margins.shape[1] // 2 + 1):
+        if sum(margin_bins(deck_size)) == margins.shape[1]:
+            return deck_size
+    raise ValueError(f"No deck size has {margins.shape[1]} margin bins")
+
+def check_or_create_margins(folder: str, combos: list, num_of_decks_scored: int,
+                            deck_size: int = DECK_SIZE) -> tuple[np.ndarray, int]:
+    """
+    Load the margin histograms saved next to the results table, or start empty ones.
+
+    Histograms left behind without a results table (num_of_decks_scored is 0) are
+    ignored, since the table they belonged to is gone. Histograms of fewer games
+    than the table are loaded with a warning: they are still a valid sample of
+    the games they count.
+
+    Parameters:
+        num_of_decks_scored (int): games in the results table, from check_or_create_wins_df
+
+    Raises:
+        ValueError: If the saved histograms are for decks of another size, or count
+                    more games than the results table
+
+    Returns:
+        tuple[np.ndarray, int]: (len(combos), trick bins + card bins) histograms in
+                                the order of combos and the number of games in them
+    """
+    trick_bins, card_bins = margin_bins(deck_size)
+    margins = np.zeros((len(combos), trick_bins + card_bins), dtype=np.int64)
+    filepath = os.path.join(folder, MARGINS_FILENAME)
+    if not os.path.exists(filepath):
+        return margins, 0
+    if num_of_decks_scored == 0:
+        print(f"Ignoring {filepath}: there is no results table next to it.")
+        return margins, 0
+
+    saved = np.load(filepath)
+    if saved["cards"].shape[1] != card_bins:
+        raise ValueError(f"Margins in {filepath} are for {(saved['cards'].shape[1] - 1) // 2}-card decks, "
+                         f"not {deck_size}-card decks")
+    num_of_games = int(saved["num_of_games"])
+    if num_of_games > num_of_decks_scored:
+        raise ValueError(f"Margins in {filepath} count {num_of_games} games, "
+                         f"but the results table only {num_of_decks_scored}")
+    if num_of_games < num_of_decks_scored:
+        print(f"Warning: margins in {filepath} only cover {num_of_games} of the {num_of_decks_scored} games "
+              f"in the results table.")
+    position = {(p1, p2): idx for idx, (p1, p2) in enumerate(zip(saved["p1"], saved["p2"]))}
+    for combo_idx, combo in enumerate(combos):
+        saved_idx = position.get((str(combo["player_a"]), str(combo["player_b"])))
+        if saved_idx is not None:
+            margins[combo_idx, :trick_bins] = saved["tricks"][saved_idx]
+            margins[combo_idx, trick_bins:] = saved["cards"][saved_idx]
+    return margins, num_of_games
+
+def save_margins(margins: np.ndarray, folder: str, combos: list, num_of_games: int) -> None:
     """
+    Save margin histograms as 'scoring_margins.npz' next to the results table.
+    Like save_dataframe_to_csv, the previous file is kept until the new one is written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    tricks, cards = split_margins(margins, margins_deck_size(margins))
+    temp_filepath = os.path.join(folder, "scoring_margins_temp.npz")
+    np.savez(
+        temp_filepath,
+        p1=np.array([str(combo["player_a"]) for combo in combos]),
+        p2=np.array([str(combo["player_b"]) for combo in combos]),
+        tricks=tricks, cards=cards, num_of_games=num_of_games,
+    )
+    os.replace(temp_filepath, os.path.join(folder, MARGINS_FILENAME))
+
+def margin_statistics(margins: np.ndarray, combos: list, lead: int = 3) -> pd.DataFrame:
+    """
+    Statistics derived from margin histograms without rescoring any deck:
+    expected margin and the probability of p1 / p2 winning by at least lead,
+    for tricks and for cards.
+    """
+    deck_size = margins_deck_size(margins)
+    df = array_to_results(np.zeros((len(combos), len(SCORE_COLUMNS)), dtype=np.int64), combos)[["p1", "p2"]]
+    for mode, histogram, offset in zip(["tricks", "cards"], split_margins(margins, deck_size), margin_limits(deck_size)):
+        values = np.arange(histogram.shape[1]) - offset
+        total = histogram.sum(axis=1)
+        df[f"expected_margin_{mode}"] = (histogram * values).sum(axis=1) / total
+        df[f"p1_wins_by_{lead}_{mode}"] = histogram[:, values >= lead].sum(axis=1) / total
+        df[f"p2_wins_by_{lead}_{mode}"] = histogram[:, values <= -lead].sum(axis=1) / total
+    return df
+
+def complement_permutation(combos: list) -> np.ndarray:
+    """
+    For every combo, the index of the combo with both players' colors swapped.
 
-    # Load or create cumulative DataFrame
-    df, num_of_decks_scored = check_or_create_wins_df(df_folder, combos)
+    Swapping red and black in a deck turns a win for (a, b) into a win for (~a, ~b)
+    on the original deck, so the complement deck's results for every combo are the
+    original deck's results reordered by this permutation.
+
+    Raises:
+        ValueError: If combos does not contain the color-swapped twin of every combo
+    """
+    position = {(str(combo["player_a"]), str(combo["player_b"])): idx for idx, combo in enumerate(combos)}
+    flip = str.maketrans("01", "10")
+    try:
+        return np.array([
+            position[(str(combo["player_a"]).translate(flip), str(combo["player_b"]).translate(flip))]
+            for combo in combos
+        ])
+    except KeyError as err:
+        raise ValueError(f"combos has no color-swapped twin for {err.args[0]}") from None
+
+def num_of_twins(antithetic: bool = False, reverse: bool = False) -> int:
+    """
+    Number of games each generated deck is scored as: itself, its color complement
+    and/or its reversal.
+    """
+    return (1 + antithetic) * (1 + reverse)
+
+def outcome_indicators(scores: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Per-deck win/loss/draw indicators from score_decks.
+
+    Returns:
+        np.ndarray: (n, len(combos), 6) int8 array, 1 where the deck gives that
+                    result, columns in SCORE_COLUMNS order
+    """
+    p1_cards, p2_cards = scores["p1_cards"], scores["p2_cards"]
+    p1_tricks, p2_tricks = scores["p1_tricks"], scores["p2_tricks"]
+    return np.stack([
+        p1_cards > p2_cards, p1_tricks > p2_tricks,
+        p1_cards < p2_cards, p1_tricks < p2_tricks,
+        p1_cards == p2_cards, p1_tricks == p2_tricks,
+    ], axis=2).astype(np.int8)
+
+def reversed_decks(decks: np.ndarray) -> np.ndarray:
+    """
+    Every deck dealt in the opposite order.
+    """
+    return as_deck_array(decks)[:, ::-1]
+
+# Most (deck, combo) pairs scored at a time. The engines keep several (decks, combos)
+# arrays, so score_batch scores longer patterns (16256 combos for 7 cards) in
+# slices of fewer decks; for 3-card patterns a slice is 18724 decks
+SCORE_BATCH_CELLS = 1 << 20
+
+def score_batch(decks: np.ndarray, combos: list, engine: str = "window",
+                antithetic: bool = False, reverse: bool = False,
+                stages: dict | None = None) -> tuple[np.ndarray, int, np.ndarray]:
+    """
+    Score a batch of decks, optionally together with their twins.
+
+    With antithetic=True every deck also counts as its color complement, which
+    needs no extra scoring since its results are the deck's results reordered by
+    complement_permutation. The complement of a deck is only another deck of the
+    batch when it holds as many red as black cards, so antithetic needs balanced
+    decks. With reverse=True every deck is also scored dealt in
+    the opposite order (and that reversal's complement when antithetic).
+    The decks are scored in slices of at most SCORE_BATCH_CELLS // len(combos) decks,
+    so memory does not grow with the number of decks or combos.
+    Time spent scoring and turning scores into counts and margins is added to the
+    'score' and 'aggregate' stages of stages when given (see src.instrument).
+
+    Returns:
+        tuple[np.ndarray, int, np.ndarray]: (len(combos), 6) win/loss/draw counts in
+            SCORE_COLUMNS order, the number of games counted and the margin_histograms
+            of those games, all from the same scoring pass
+
+    Raises:
+        ValueError: If antithetic is True and the decks are not balanced
+    """
+    deck_size = deck_size_of(decks)
+    if antithetic and len(decks) and len(set(deck_composition(decks))) != 1:
+        num_red, num_black = deck_composition(decks)
+        raise ValueError(f"Antithetic twins need as many red as black cards, not {num_red} red and {num_black} black")
+    counts = np.zeros((len(combos), len(SCORE_COLUMNS)), dtype=np.int64)
+    margins = np.zeros((len(combos), sum(margin_bins(deck_size))), dtype=np.int64)
+    slice_size = max(1, SCORE_BATCH_CELLS // len(combos))
+    for start in range(0, len(decks), slice_size):
+        batch = decks[start:start + slice_size]
+        for dealt in ([batch, reversed_decks(batch)] if reverse else [batch]):
+            with timed(stages, "score"):
+                scores = score_decks(dealt, combos, engine=engine)
+            with timed(stages, "aggregate"):
+                counts += wins_to_array(count_wins_batch(scores))
+                margins += margin_histograms(scores, deck_size)
+    if antithetic:
+        with timed(stages, "aggregate"):
+            twin = complement_permutation(combos)
+            counts += counts[twin]
+            margins += margins[twin]
+    return counts, len(decks) * num_of_twins(antithetic, reverse), margins
+
+def twin_outcome_sums(decks: np.ndarray, combos: list, engine: str = "window",
+                      antithetic: bool = True, reverse: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sums and sums of squares over a batch of decks of every deck's win/loss/draw
+    indicators averaged over its twins, so batches can be combined before the
+    standard errors are computed (see twin_estimates).
+
+    Raises:
+        ValueError: If antithetic is True and the decks are not balanced
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (len(combos), 6) float64 sums and sums of squares
+    """
+    if antithetic and len(decks) and len(set(deck_composition(decks))) != 1:
+        num_red, num_black = deck_composition(decks)
+        raise ValueError(f"Antithetic twins need as many red as black cards, not {num_red} red and {num_black} black")
+    per_deck = outcome_indicators(score_decks(decks, combos, engine=engine)).astype(np.float64)
+    if reverse:
+        per_deck += outcome_indicators(score_decks(reversed_decks(decks), combos, engine=engine))
+    if antithetic:
+        per_deck += per_deck[:, complement_permutation(combos)]
+    per_deck /= num_of_twins(antithetic, reverse)
+    return per_deck.sum(axis=0), (per_deck ** 2).sum(axis=0)
+
+def twin_estimates(sums: np.ndarray, squares: np.ndarray, num_of_decks: int, combos: list) -> pd.DataFrame:
+    """
+    Rate estimates and standard errors from the twin_outcome_sums of num_of_decks decks.
+
+    Returns:
+        pd.DataFrame: p1, p2, then '<column>_rate', '<column>_se' and '<column>_plain_se'
+                      for every column in SCORE_COLUMNS, where plain_se is the standard
+                      error plain sampling of as many decks without twins would give
+    """
+    rates = sums / num_of_decks
+    variances = np.maximum(squares - num_of_decks * rates ** 2, 0) / (num_of_decks - 1)
+    errors = np.sqrt(variances / num_of_decks)
+    plain_errors = np.sqrt(rates * (1 - rates) / num_of_decks)
+
+    df = array_to_results(np.zeros((len(combos), len(SCORE_COLUMNS)), dtype=np.int64), combos)[["p1", "p2"]]
+    for col_idx, col in enumerate(SCORE_COLUMNS):
+        df[f"{col}_rate"] = rates[:, col_idx]
+        df[f"{col}_se"] = errors[:, col_idx]
+        df[f"{col}_plain_se"] = plain_errors[:, col_idx]
+    return df
+
+def symmetric_estimates(decks: np.ndarray, combos: list, engine: str = "window",
+                        antithetic: bool = True, reverse: bool = False) -> pd.DataFrame:
+    """
+    Win/loss/draw rate estimates and their standard errors from a batch of decks.
+
+    Each deck's result is averaged over its twins first, so the standard errors
+    take the correlation between a deck and its twins into account. With
+    antithetic=False and reverse=False these are the plain sampling estimates.
+
+    Returns:
+        pd.DataFrame: see twin_estimates
+    """
+    sums, squares = twin_outcome_sums(decks, combos, engine, antithetic, reverse)
+    return twin_estimates(sums, squares, len(decks), combos)
+
+# Decks of a packed file scored at a time
+PACKED_CHUNK_SIZE = 10000
+
+def score_file(full_path: str, combos: list, engine: str = "window",
+               antithetic: bool = False, reverse: bool = False,
+               stages: dict | None = None) -> tuple[np.ndarray, int, np.ndarray]:
+    """
+    Score every deck in one deck file.
+
+    Takes a file path rather than the decks so it can run in a worker process
+    without pickling the deck array. Reading the file, decoding it into decks,
+    scoring and aggregating are timed as the 'load', 'decode', 'score' and
+    'aggregate' stages of stages when given.
+
+    Returns:
+        tuple[np.ndarray, int, np.ndarray]: (len(combos), 6) win/loss/draw counts in
+            SCORE_COLUMNS order, the number of games (the number of decks times
+            num_of_twins) and the margin histograms
+    """
+    if full_path.endswith(PACKED_EXTENSION):
+        # packed files are scored a chunk at a time straight from their packed rows
+        header = read_header(full_path)
+        counts = np.zeros((len(combos), len(SCORE_COLUMNS)), dtype=np.int64)
+        margins = np.zeros((len(combos), sum(margin_bins(header["deck_size"]))), dtype=np.int64)
+        num_of_games = 0
+        for start in range(0, header["num_of_decks"], PACKED_CHUNK_SIZE):
+            with timed(stages, "load"):
+                rows, _ = load_packed_rows(full_path, start, start + PACKED_CHUNK_SIZE)
+            with timed(stages, "decode"):
+                decks = rows_to_decks(rows, header["deck_size"])
+            chunk_counts, chunk_games, chunk_margins = score_batch(decks, combos, engine, antithetic, reverse, stages)
+            counts += chunk_counts
+            margins += chunk_margins
+            num_of_games += chunk_games
+        return counts, num_of_games, margins
+
+    with timed(stages, "load"):
+        decks = np.load(full_path)
+    with timed(stages, "decode"):
+        decks = decks.reshape(-1) if decks.dtype == np.uint64 else as_deck_array(decks)
+    return score_batch(decks, combos, engine, antithetic, reverse, stages)
+
+def timed_score_file(full_path: str, combos: list, engine: str = "window",
+                     antithetic: bool = False, reverse: bool = False) -> tuple[np.ndarray, int, np.ndarray, dict]:
+    """
+    score_file that also returns the stage timings of the file, so they can be
+    sent back from a worker process.
+    """
+    stages = {}
+    counts, num_of_games, margins = score_file(full_path, combos, engine, antithetic, reverse, stages)
+    return counts, num_of_games, margins, stages
+
+def scored_files(data_folder: str, raw_files: list[str], combos: list, engine: str = "window", workers: int = 1,
+                 antithetic: bool = False, reverse: bool = False):
+    """
+    Score raw files and yield (filename, counts, num_of_games, margins, stages) as each one finishes.
+
+    With workers > 1 the files are scored in a process pool and yielded in the
+    order they finish, otherwise they are scored one after another.
+    """
+    if workers <= 1:
+        for filename in raw_files:
+            yield filename, *timed_score_file(os.path.join(data_folder, filename), combos, engine, antithetic, reverse)
+        return
+
+    prepare_engine(engine)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(timed_score_file, os.path.join(data_folder, filename), combos, engine,
+                            antithetic, reverse): filename
+            for filename in raw_files
+        }
+        for future in as_completed(futures):
+            yield futures[future], *future.result()
+
+def profile_file(full_path: str, combos: list, engine: str = "window", mode: str = "cprofile",
+                 antithetic: bool = False, reverse: bool = False, top: int = 25) -> str:
+    """
+    Score a single deck file under cProfile or tracemalloc (see profile_call) and
+    return the report. Nothing is saved and the file is not renamed.
+    """
+    _, report = profile_call(score_file, full_path, combos, engine, antithetic, reverse, mode=mode, top=top)
+    return report
+
+def analyze(data_folder: str, df_folder: str, combos: list, tot_decks: int, engine: str = "window", workers: int = 1,
+            antithetic: bool = False, reverse: bool = False, metrics_path: str | None = None,
+            profile: str | None = None):
+    """
+    Load all raw deck files, score each deck using combos, and save/update a cumulative DataFrame.
+    Prints cumulative progress over total number of decks, with decks/s and the ETA,
+    at most twice a second.
+    The engine picks which scoring engine in ENGINES score_decks uses.
+    With workers > 1 whole files are scored in that many processes and the parent
+    adds each file's counts to the cumulative counts before renaming it.
+    The cumulative counts are a (len(combos), 6) int64 array updated in place and
+    only turned into a DataFrame when saving.
+    With antithetic and/or reverse every deck is also counted as its color complement
+    and/or reversal (see score_batch), so N in the saved file counts games, not decks.
+    Histograms of the trick and card margins of every combo are accumulated in the
+    same pass and saved next to the results as scoring_margins.npz.
+    Every raw file must hold decks of the same composition, and the results and
+    margins saved in df_folder must be for decks of that composition.
+    Time is tracked per stage (load, decode, score, aggregate, accumulate, rename,
+    save) and summed over all files; in worker processes it is the workers' time.
+    With metrics_path every file and the final summary are appended to that
+    JSON lines file. With profile ('cprofile' or 'tracemalloc') the first raw file
+    is scored once more under the profiler first and the report is printed.
+    """
 
     # Get all raw files
     raw_files = sorted([f for f in os.listdir(data_folder) if "raw" in f and os.path.isfile(os.path.join(data_folder, f))])
@@ -306,96 +1233,66 @@ def analyze(data_folder: str, df_folder: str, combos: list, tot_decks: int):
         print("No raw files found to process.")
         return
 
+    # The results and margin bins depend on the deck composition, so every file must agree on it
+    num_red, num_black = raw_composition(data_folder, raw_files)
+
+    # Load or create cumulative DataFrame, then keep the counts as an array
+    df, num_of_decks_scored = check_or_create_wins_df(df_folder, combos, num_red, num_black)
+    totals = results_to_array(df, combos)
+    margins, num_of_games_in_margins = check_or_create_margins(df_folder, combos, num_of_decks_scored,
+                                                               num_red + num_black)
+
+    if profile is not None:
+        print(profile_file(os.path.join(data_folder, raw_files[0]), combos, engine, profile, antithetic, reverse))
 
     total_decks = tot_decks
     total_decks_processed = 0
+    twins = num_of_twins(antithetic, reverse)
+    stages = {}
+    progress = new_progress(total_decks)
+    metrics_file = open_metrics(metrics_path)
 
-    # Process decks file by file
-    for file_idx, filename in enumerate(raw_files):
-        full_path = os.path.join(data_folder, filename)
-        decks = np.load(full_path)
-        if decks.ndim == 1:
-            decks = decks[np.newaxis, :]
-        elif decks.ndim == 3 and decks.shape[0] == 1:
-            decks = decks[0]
-
-        for single_deck in decks:
-            df_scores = score_deck(single_deck, combos)
-            df_wins = count_wins(df_scores)
-            df = update_results(df, df_wins)
-
-            total_decks_processed += 1
-            num_of_decks_scored += 1
-
-            # Update every 10k decks or at the last deck
-            if (total_decks_processed % 10000 == 0) or (total_decks_processed == total_decks):
-                progress_percent = (total_decks_processed / total_decks) * 100
-                print(f"Processed {total_decks_processed}/{total_decks} decks ({progress_percent:.2f}%)", end='\r', flush=True)
-
-        # Rename after processing
-        rename_raw_to_cooked(data_folder, filename)
-        
-    save_dataframe_to_csv(df, df_folder, num_of_decks_scored)
+    try:
+        # Process decks file by file
+        for filename, counts, num_of_games, file_margins, file_stages in scored_files(
+                data_folder, raw_files, combos, engine, workers, antithetic, reverse):
+            # Add the file's win counts and margins in place
+            with timed(file_stages, "accumulate"):
+                totals += counts
+                margins += file_margins
+                num_of_games_in_margins += num_of_games
+
+            total_decks_processed += num_of_games // twins
+            num_of_decks_scored += num_of_games
+
+            # Rename after processing
+            with timed(file_stages, "rename"):
+                rename_raw_to_cooked(data_folder, filename)
+
+            merge_stages(stages, file_stages)
+            write_metrics(metrics_file, {"event": "file", "filename": filename, "decks": num_of_games // twins,
+                                         "stages": stage_seconds(file_stages)})
+            report_progress(progress, total_decks_processed)
+
+        report_progress(progress, total_decks_processed, force=True)
+        print()
+
+        with timed(stages, "save"):
+            save_dataframe_to_csv(array_to_results(totals, combos), df_folder, num_of_decks_scored,
+                                  num_red, num_black)
+            save_margins(margins, df_folder, combos, num_of_games_in_margins)
+
+        elapsed = time.perf_counter() - progress["start"]
+        write_metrics(metrics_file, {"event": "summary", "decks": total_decks_processed, "files": len(raw_files),
+                                     "seconds": round(elapsed, 6), "decks_per_second": total_decks_processed / elapsed,
+                                     "engine": engine, "workers": workers, "stages": stage_seconds(stages)})
+    finally:
+        if metrics_file is not None:
+            metrics_file.close()
+
+    print(f"Stages: {format_stages(stages)}")
     print(f"Total decks scored: {num_of_decks_scored}")
     
 
 #list of dictionaries with the 56 relevant players' choices combos
-combos = [
-    {"player_a": '000', "player_b": '001'},
-    {"player_a": '000', "player_b": '010'},
-    {"player_a": '000', "player_b": '011'},
-    {"player_a": '000', "player_b": '100'},
-    {"player_a": '000', "player_b": '101'},
-    {"player_a": '000', "player_b": '110'},
-    {"player_a": '000', "player_b": '111'},
-    {"player_a": '001', "player_b": '000'},
-    {"player_a": '001', "player_b": '010'},
-    {"player_a": '001', "player_b": '011'},
-    {"player_a": '001', "player_b": '100'},
-    {"player_a": '001', "player_b": '101'},
-    {"player_a": '001', "player_b": '110'},
-    {"player_a": '001', "player_b": '111'},
-    {"player_a": '010', "player_b": '000'},
-    {"player_a": '010', "player_b": '001'},
-    {"player_a": '010', "player_b": '011'},
-    {"player_a": '010', "player_b": '100'},
-    {"player_a": '010', "player_b": '101'},
-    {"player_a": '010', "player_b": '110'},
-    {"player_a": '010', "player_b": '111'},
-    {"player_a": '011', "player_b": '000'},
-    {"player_a": '011', "player_b": '001'},
-    {"player_a": '011', "player_b": '010'},
-    {"player_a": '011', "player_b": '100'},
-    {"player_a": '011', "player_b": '101'},
-    {"player_a": '011', "player_b": '110'},
-    {"player_a": '011', "player_b": '111'},
-    {"player_a": '100', "player_b": '000'},
-    {"player_a": '100', "player_b": '001'},
-    {"player_a": '100', "player_b": '010'},
-    {"player_a": '100', "player_b": '011'},
-    {"player_a": '100', "player_b": '101'},
-    {"player_a": '100', "player_b": '110'},
-    {"player_a": '100', "player_b": '111'},
-    {"player_a": '101', "player_b": '000'},
-    {"player_a": '101', "player_b": '001'},
-    {"player_a": '101', "player_b": '010'},
-    {"player_a": '101', "player_b": '011'},
-    {"player_a": '101', "player_b": '100'},
-    {"player_a": '101', "player_b": '110'},
-    {"player_a": '101', "player_b": '111'},
-    {"player_a": '110', "player_b": '000'},
-    {"player_a": '110', "player_b": '001'},
-    {"player_a": '110', "player_b": '010'},
-    {"player_a": '110', "player_b": '011'},
-    {"player_a": '110', "player_b": '100'},
-    {"player_a": '110', "player_b": '101'},
-    {"player_a": '110', "player_b": '111'},
-    {"player_a": '111', "player_b": '000'},
-    {"player_a": '111', "player_b": '001'},
-    {"player_a": '111', "player_b": '010'},
-    {"player_a": '111', "player_b": '011'},
-    {"player_a": '111', "player_b": '100'},
-    {"player_a": '111', "player_b": '101'},
-    {"player_a": '111', "player_b": '110'},
-]
-
+combos = make_combos(3)
@@ -0,0 +1,115 @@
+import numpy as np
+
+from src.automaton import combo_tables, num_states, P1_TRICK, P2_TRICK
+from src.scoring import (
+    check_or_create_wins_df, results_to_array, array_to_results, save_dataframe_to_csv,
+    check_or_create_margins, save_margins, combo_codes, pattern_length, count_wins_batch, wins_to_array,
+    margin_histograms, margin_bins, SCORE_COLUMNS,
+)
+
+# ----------------------------------------------------------
+# Lockstep Simulator
+# ----------------------------------------------------------
+#
+# Plays M games side by side without ever building an (M, 52) deck matrix.
+# Card j of every game is drawn from the reds and blacks that game has left,
+# red with probability reds_left / cards_left, which deals a uniformly shuffled
+# deck one card at a time. Every combo's state machine is stepped with the card
+# as soon as it is drawn.
+
+
+def simulate_batch(num_games: int, combos: list, rng: np.random.Generator,
+                   num_red: int = 26, num_black: int = 26) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Play num_games games for every combo in lockstep.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (len(combos), 6) win/loss/draw counts in
+            SCORE_COLUMNS order and the margin_histograms of the same games
+    """
+    p1_codes, p2_codes = combo_codes(combos)
+    k = pattern_length(combos)
+    transition, emit = combo_tables(p1_codes, p2_codes, k)
+    shape = (num_games, len(combos))
+
+    # cards won never exceed the deck size, so small integers are enough
+    p1_tricks = np.zeros(shape, dtype=np.int16)
+    p1_cards = np.zeros(shape, dtype=np.int16)
+    p2_tricks = np.zeros(shape, dtype=np.int16)
+    p2_cards = np.zeros(shape, dtype=np.int16)
+    pile = np.zeros(shape, dtype=np.int16)
+
+    base = np.arange(len(combos), dtype=np.intp) * (num_states(k) * 2)
+    index = np.broadcast_to(base, shape).copy()
+
+    reds_left = np.full(num_games, num_red, dtype=np.int64)
+    deck_size = num_red + num_black
+
+    for dealt in range(deck_size):
+        cards_left = deck_size - dealt
+        card = rng.random(num_games) * cards_left < reds_left
+        reds_left -= card
+
+        index += card[:, np.newaxis]
+        result = np.take(emit, index)
+        pile += 1
+
+        p1_hit = result == P1_TRICK
+        p2_hit = result == P2_TRICK
+        p1_tricks += p1_hit
+        p1_cards += np.where(p1_hit, pile, 0).astype(np.int16)
+        p2_tricks += p2_hit
+        p2_cards += np.where(p2_hit, pile, 0).astype(np.int16)
+        pile[p1_hit | p2_hit] = 0
+
+        index = base + np.take(transition, index) * 2
+
+    scores = {"p1_tricks": p1_tricks, "p1_cards": p1_cards, "p2_tricks": p2_tricks, "p2_cards": p2_cards}
+    return wins_to_array(count_wins_batch(scores)), margin_histograms(scores, deck_size)
+
+
+def simulate(tot_decks: int, combos: list, batch_size: int = 20000, seed: int | np.random.SeedSequence | None = None,
+             num_red: int = 26, num_black: int = 26) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Play tot_decks games for every combo, batch_size games at a time, with decks
+    of num_red red and num_black black cards.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (len(combos), 6) win/loss/draw counts in
+            SCORE_COLUMNS order and the margin_histograms of the same games
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.zeros((len(combos), len(SCORE_COLUMNS)), dtype=np.int64)
+    margins = np.zeros((len(combos), sum(margin_bins(num_red + num_black))), dtype=np.int64)
+    for start in range(0, tot_decks, batch_size):
+        batch_counts, batch_margins = simulate_batch(min(batch_size, tot_decks - start), combos, rng,
+                                                     num_red, num_black)
+        counts += batch_counts
+        margins += batch_margins
+    return counts, margins
+
+
+def simulate_analyze(tot_decks: int, df_folder: str, combos: list, batch_size: int = 20000, seed: int | None = None,
+                     num_red: int = 26, num_black: int = 26):
+    """
+    Simulate tot_decks games and add them to the cumulative results table,
+    the same table and margins analyze would save after generating and scoring the decks.
+    The card draws are seeded by seed and the number of games already in the table,
+    so simulating again with the same seed plays new games.
+    """
+    df, num_of_decks_scored = check_or_create_wins_df(df_folder, combos, num_red, num_black)
+    totals = results_to_array(df, combos)
+    margins, num_of_games_in_margins = check_or_create_margins(df_folder, combos, num_of_decks_scored,
+                                                               num_red + num_black)
+
+    seed_seq = np.random.SeedSequence(seed, spawn_key=(num_of_decks_scored,))
+    counts, simulated_margins = simulate(tot_decks, combos, batch_size, seed_seq, num_red, num_black)
+    totals += counts
+    margins += simulated_margins
+    num_of_decks_scored += tot_decks
+    num_of_games_in_margins += tot_decks
+
+    save_dataframe_to_csv(array_to_results(totals, combos), df_folder, num_of_decks_scored, num_red, num_black)
+    save_margins(margins, df_folder, combos, num_of_games_in_margins)
+    print(f"Total decks scored: {num_of_decks_scored}")
+    return totals
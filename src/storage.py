@@ -0,0 +1,143 @@
+import os
+import struct
+
+import numpy as np
+
+from src.bitpacked import DECK_SIZE
+
+# ----------------------------------------------------------
+# Packed Deck File Format (.pkd)
+# ----------------------------------------------------------
+#
+# header (32 bytes, little-endian):
+#   magic            8 bytes   b"PENNEYPK"
+#   version          uint16
+#   deck_size        uint16    cards per deck (52)
+#   bytes_per_deck   uint16    ceil(deck_size / 8) = 7
+#   reserved         uint16
+#   num_of_decks     uint64
+#   reserved         8 bytes
+# body:
+#   num_of_decks rows of bytes_per_deck bytes, np.packbits of each deck along the
+#   card axis with bitorder='little', so card j is bit j % 8 of byte j // 8.
+#
+# A row is the first 7 bytes of the deck's little-endian uint64 from src.bitpacked.
+
+PACKED_EXTENSION = ".pkd"
+MAGIC = b"PENNEYPK"
+VERSION = 1
+HEADER = struct.Struct("<8sHHHHQ8x")
+
+
+def bytes_per_deck(deck_size: int) -> int:
+    """
+    Number of bytes one packed deck takes.
+    """
+    return (deck_size + 7) // 8
+
+
+def save_packed(decks: np.ndarray, filepath: str):
+    """
+    Save an (n, deck_size) boolean deck array to a packed .pkd file.
+
+    Parameters:
+        decks (np.ndarray): (n, deck_size) array of decks
+        filepath (str): file to write
+    """
+    decks = np.asarray(decks, dtype=bool)
+    num_of_decks, deck_size = decks.shape
+
+    directory = os.path.dirname(filepath)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    packed = np.packbits(decks, axis=1, bitorder="little")
+    with open(filepath, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, deck_size, bytes_per_deck(deck_size), 0, num_of_decks))
+        f.write(packed.tobytes())
+
+
+def read_header(filepath: str) -> dict:
+    """
+    Read the header of a packed .pkd file.
+
+    Raises:
+        ValueError: If the file is not a packed deck file or has an unknown version
+
+    Returns:
+        dict: version, deck_size, bytes_per_deck and num_of_decks
+    """
+    with open(filepath, "rb") as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError(f"File too short to be a packed deck file: {filepath}")
+
+    magic, version, deck_size, row_bytes, _, num_of_decks = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"Not a packed deck file: {filepath}")
+    if version != VERSION:
+        raise ValueError(f"Unsupported packed deck file version {version}: {filepath}")
+
+    return {
+        "version": version,
+        "deck_size": deck_size,
+        "bytes_per_deck": row_bytes,
+        "num_of_decks": num_of_decks,
+    }
+
+
+def load_packed_rows(filepath: str, start: int = 0, stop: int | None = None) -> tuple[np.ndarray, dict]:
+    """
+    Read the packed rows of decks start:stop without unpacking them.
+
+    Returns:
+        tuple[np.ndarray, dict]: (num_of_decks, bytes_per_deck) uint8 rows and the header
+    """
+    header = read_header(filepath)
+    stop = header["num_of_decks"] if stop is None else min(stop, header["num_of_decks"])
+    start = min(start, stop)
+    row_bytes = header["bytes_per_deck"]
+
+    with open(filepath, "rb") as f:
+        f.seek(HEADER.size + start * row_bytes)
+        rows = np.fromfile(f, dtype=np.uint8, count=(stop - start) * row_bytes)
+
+    return rows.reshape(-1, row_bytes), header
+
+
+def load_packed(filepath: str, start: int = 0, stop: int | None = None) -> np.ndarray:
+    """
+    Load decks start:stop of a packed .pkd file as an (n, deck_size) boolean array.
+    """
+    rows, header = load_packed_rows(filepath, start, stop)
+    return np.unpackbits(rows, axis=1, count=header["deck_size"], bitorder="little").astype(bool)
+
+
+def load_packed_masks(filepath: str, start: int = 0, stop: int | None = None) -> np.ndarray:
+    """
+    Load decks start:stop of a packed .pkd file as uint64 masks for the bitwise engine,
+    by padding each 7-byte row to 8 bytes instead of unpacking the cards.
+    """
+    rows, header = load_packed_rows(filepath, start, stop)
+    if header["bytes_per_deck"] > 8:
+        raise ValueError(f"Decks of {header['deck_size']} cards do not fit in a uint64: {filepath}")
+    return rows_to_masks(rows)
+
+
+def rows_to_masks(rows: np.ndarray) -> np.ndarray:
+    """
+    Turn (n, bytes_per_deck) packed rows into uint64 masks by padding each row to 8 bytes.
+    """
+    padded = np.zeros((rows.shape[0], 8), dtype=np.uint8)
+    padded[:, :rows.shape[1]] = rows
+    return padded.view("<u8").reshape(-1).astype(np.uint64, copy=False)
+
+
+def rows_to_decks(rows: np.ndarray, deck_size: int) -> np.ndarray:
+    """
+    Decode packed rows for scoring: uint64 masks for standard 52-card decks, which
+    every engine scores without unpacking, or (n, deck_size) booleans for other decks.
+    """
+    if deck_size == DECK_SIZE:
+        return rows_to_masks(rows)
+    return np.unpackbits(rows, axis=1, count=deck_size, bitorder="little").astype(bool)
@@ -0,0 +1,223 @@
+import io
+import os
+import re
+import time
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.pipeline import stream_analyze
+from src.scoring import array_to_results, pattern_length, prepare_engine
+
+# ----------------------------------------------------------
+# Deck Composition Sweep
+# ----------------------------------------------------------
+#
+# A sweep scores the same combos on decks of several compositions, e.g. 20 to 104
+# cards with more red than black cards. Every composition is one configuration,
+# streamed through stream_analyze into its own folder of the sweep folder:
+#
+#   <sweep_folder>/red{R}_black{B}/scoring_analysis_N=*.csv
+#   <sweep_folder>/red{R}_black{B}/scoring_margins.npz
+#
+# so each configuration's table can be rendered and extended like any other.
+# The sweep folder also gets a combined index with one row per configuration and
+# a table of the best response to every opponent pattern in every configuration.
+#
+# Configurations run in parallel on a process pool, one configuration per worker.
+# Each one's seed streams come from the sweep's root entropy, its (R, B) and the
+# number of games already in its table, so a configuration gets the same decks
+# whatever else is in the grid, and running the sweep again with the same root
+# entropy adds new decks instead of counting the first run's decks twice.
+
+SWEEP_INDEX_FILENAME = "sweep_index.csv"
+BEST_RESPONSES_FILENAME = "sweep_best_responses.csv"
+
+# columns of the results table that add up to the number of games of a combo
+GAME_COLUMNS = ["p1_wins_cards", "p2_wins_cards", "draws_cards"]
+
+DEFAULT_DECK_SIZES = (20, 32, 52, 78, 104)
+DEFAULT_RED_FRACTIONS = (0.5,)
+
+
+def deck_grid(deck_sizes, red_fractions) -> list[tuple[int, int]]:
+    """
+    Every (num_red, num_black) composition of the given deck sizes and fractions of red cards.
+
+    Raises:
+        ValueError: If a deck size is not positive or a fraction is not between 0 and 1
+
+    Returns:
+        list[tuple[int, int]]: compositions in grid order, without duplicates
+    """
+    configs = []
+    for deck_size in deck_sizes:
+        if deck_size <= 0:
+            raise ValueError(f"Deck sizes must be positive, got {deck_size}")
+        for fraction in red_fractions:
+            if not 0 <= fraction <= 1:
+                raise ValueError(f"Fractions of red cards must be between 0 and 1, got {fraction}")
+            num_red = int(round(deck_size * fraction))
+            if (num_red, deck_size - num_red) not in configs:
+                configs.append((num_red, deck_size - num_red))
+    return configs
+
+
+def config_name(num_red: int, num_black: int) -> str:
+    """
+    Folder name of a configuration in the sweep folder.
+    """
+    return f"red{num_red}_black{num_black}"
+
+
+def config_entropy(root_entropy: int, num_red: int, num_black: int, num_of_games: int = 0) -> int:
+    """
+    Root entropy of one configuration's seed streams, derived from the sweep's root
+    entropy and the number of games already in the configuration's table.
+    """
+    words = np.random.SeedSequence(root_entropy, spawn_key=(num_red, num_black, num_of_games)).generate_state(4)
+    return sum(int(word) << (32 * i) for i, word in enumerate(words))
+
+
+def games_in_table(folder: str) -> int:
+    """
+    Number of games in the results table of a configuration folder, 0 if it has none yet.
+    """
+    if not os.path.isdir(folder):
+        return 0
+    for filename in os.listdir(folder):
+        match = re.match(r"scoring_analysis_N=(\d+)\.csv$", filename)
+        if match:
+            return int(match.group(1))
+    return 0
+
+
+def score_config(num_red: int, num_black: int, tot_decks: int, folder: str, combos: list,
+                 chunk_size: int = 10000, engine: str = "window", entropy: int | None = None) -> tuple[np.ndarray, float]:
+    """
+    Stream tot_decks decks of one composition through stream_analyze into folder,
+    with its progress output silenced so parallel configurations don't mix lines.
+
+    Returns:
+        tuple[np.ndarray, float]: the cumulative (len(combos), 6) counts and the seconds taken
+    """
+    start = time.perf_counter()
+    os.makedirs(folder, exist_ok=True)
+    with redirect_stdout(io.StringIO()):
+        totals = stream_analyze(tot_decks, folder, combos, chunk_size=chunk_size, engine=engine,
+                                entropy=entropy, num_red=num_red, num_black=num_black)
+    return totals, time.perf_counter() - start
+
+
+def best_responses(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    For every opponent pattern (p1), my pattern (p2) with the highest chance of
+    winning against it by tricks and by cards, and that chance.
+    """
+    games = df[GAME_COLUMNS].sum(axis=1)
+    rows = []
+    for opponent, group in df.groupby("p1", sort=False):
+        row = {"opponent": opponent}
+        for mode in ["tricks", "cards"]:
+            win_rate = group[f"p2_wins_{mode}"] / games[group.index]
+            best = win_rate.idxmax()
+            row[f"best_response_{mode}"] = group.at[best, "p2"]
+            row[f"win_rate_{mode}"] = win_rate[best]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def scored_configs(workers: int, *args):
+    """
+    Run score_config over the argument lists in args and yield each configuration's
+    result in order, in a process pool when workers > 1.
+    """
+    if workers <= 1:
+        yield from map(score_config, *args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(score_config, *args)
+
+
+def sweep(deck_configs: list[tuple[int, int]], tot_decks: int, sweep_folder: str, combos: list,
+          workers: int = 1, chunk_size: int = 10000, engine: str = "window",
+          entropy: int | None = None) -> pd.DataFrame:
+    """
+    Score tot_decks decks of every (num_red, num_black) composition in deck_configs
+    and save one results table per configuration plus the combined index.
+
+    Like stream_analyze, running a sweep again adds new decks to every configuration's
+    table. The seed streams also depend on the games already in a table, so a run
+    with the same entropy as an earlier one deals new decks rather than the same ones.
+
+    Parameters:
+        deck_configs (list[tuple[int, int]]): compositions to score, e.g. from deck_grid
+        tot_decks (int): decks generated and scored per configuration
+        sweep_folder (str): folder of the configuration folders and the index
+        combos (list): a list of all the combinations of players' choices
+        workers (int): configurations scored at the same time in worker processes
+        chunk_size (int): decks generated and scored at a time per configuration
+        engine (str): name of the scoring engine in ENGINES, 'window' or 'fsa'
+                      unless every deck has 52 cards
+        entropy (int | None): root entropy of the sweep
+
+    Raises:
+        ValueError: If a deck is shorter than the patterns
+
+    Returns:
+        pd.DataFrame: the index, one row per configuration with its deck size,
+                      number of games, results file and run time
+    """
+    k = pattern_length(combos)
+    for num_red, num_black in deck_configs:
+        if num_red + num_black < k:
+            raise ValueError(f"Decks of {num_red + num_black} cards are shorter than {k}-card patterns")
+
+    root_entropy = np.random.SeedSequence(entropy).entropy
+    print(f"Root entropy of this sweep: {root_entropy}")
+
+    folders = [os.path.join(sweep_folder, config_name(num_red, num_black)) for num_red, num_black in deck_configs]
+    entropies = [config_entropy(root_entropy, num_red, num_black, games_in_table(folder))
+                 for (num_red, num_black), folder in zip(deck_configs, folders)]
+    n = len(deck_configs)
+    if workers > 1:
+        prepare_engine(engine)
+    results = scored_configs(
+        workers, [num_red for num_red, _ in deck_configs], [num_black for _, num_black in deck_configs],
+        [tot_decks] * n, folders, [combos] * n, [chunk_size] * n, [engine] * n, entropies,
+    )
+
+    index_rows = []
+    best_tables = []
+    for config_idx, (totals, seconds) in enumerate(results):
+        num_red, num_black = deck_configs[config_idx]
+        df = array_to_results(totals, combos)
+        # every game of a combo is a card win, loss or draw
+        num_of_games = int(df.loc[0, GAME_COLUMNS].sum())
+        index_rows.append({
+            "num_red": num_red,
+            "num_black": num_black,
+            "deck_size": num_red + num_black,
+            "num_of_games": num_of_games,
+            "folder": config_name(num_red, num_black),
+            "results_file": os.path.join(config_name(num_red, num_black), f"scoring_analysis_N={num_of_games}.csv"),
+            "root_entropy": str(root_entropy),
+            "entropy": str(entropies[config_idx]),
+            "seconds": round(seconds, 3),
+        })
+        best = best_responses(df)
+        best.insert(0, "num_black", num_black)
+        best.insert(0, "num_red", num_red)
+        best_tables.append(best)
+        print(f"Finished {config_idx + 1}/{n} configurations ({config_name(num_red, num_black)}, "
+              f"{seconds:.1f}s)", end='\r', flush=True)
+    print()
+
+    index = pd.DataFrame(index_rows)
+    os.makedirs(sweep_folder, exist_ok=True)
+    index.to_csv(os.path.join(sweep_folder, SWEEP_INDEX_FILENAME), index=False)
+    pd.concat(best_tables, ignore_index=True).to_csv(os.path.join(sweep_folder, BEST_RESPONSES_FILENAME), index=False)
+    print(f"Sweep index saved to {os.path.join(sweep_folder, SWEEP_INDEX_FILENAME)}")
+    return index
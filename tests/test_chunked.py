@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+
+from src.chunked import DEFAULT_CACHE, load_chunk_tables, tables_hash
+from src.datageneration import generate_decks
+from src.scoring import make_combos, score_decks
+
+
+def test_chunked_matches_window():
+    decks = generate_decks(5000, 2024)
+    combos = make_combos(3)
+    window = score_decks(decks, combos, "window")
+    chunked = score_decks(decks, combos, "chunked")
+    assert window.keys() == chunked.keys()
+    for key in window:
+        np.testing.assert_array_equal(chunked[key], window[key])
+
+
+def test_cache_named_by_tables_hash():
+    assert tables_hash() in os.path.basename(DEFAULT_CACHE)
+
+
+def test_cache_written_atomically(tmp_path):
+    cache_path = tmp_path / "cache" / "chunk_tables.npy"
+    built = load_chunk_tables(str(cache_path))
+    assert os.listdir(cache_path.parent) == ["chunk_tables.npy"]
+    np.testing.assert_array_equal(load_chunk_tables(str(cache_path)), built)